@@ -0,0 +1,484 @@
+"""
+Benchmarks for matcher hot paths. Runs offline on synthetic data.
+
+    python benchmarks.py parse --size-mb 4
+    python benchmarks.py suite --files 12 --registers 1000,10000,100000 --json run.json
+    python benchmarks.py compare baseline.json run.json --tolerance 0.15
+    python benchmarks.py rss --sizes-mb 1,16,64,256 --json rss.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+import pandas as pd
+import pytesseract
+from docx import Document
+from PIL import Image, ImageDraw
+
+from matcher import (
+    ID_PATTERNS, SERIAL_PATTERNS, MODEL_PATTERNS, MANUFACTURER_PATTERNS,
+    AssetIndex, analyze_file, extract_text_any, file_meta, guess_title_terms, match_files_to_assets,
+    parse_identifiers, score_candidate,
+)
+
+
+# ---------- Synthetic Data ----------
+
+FILLER_WORDS = (
+    "the pump shall be inspected monthly for leaks vibration and noise check "
+    "bearing temperature replace seals isolate supply before servicing refer "
+    "to drawing section schedule lubrication filter motor valve pressure"
+).split()
+
+
+def synthetic_manual_text(size_bytes: int, seed: int = 0) -> str:
+    """
+    Manual-like text: mostly prose, with nameplate lines (tags, serials,
+    models, manufacturers) sprinkled through it.
+    """
+    rng = random.Random(seed)
+    out = []
+    total = 0
+    while total < size_bytes:
+        roll = rng.random()
+        if roll < 0.02:
+            line = f"Asset Tag: {rng.choice(['AHU', 'CHW', 'BLR', 'FCU'])}-{rng.randint(100, 99999)}"
+        elif roll < 0.03:
+            line = f"S/N: {rng.choice('ABCXYZ')}{rng.randint(10000, 9999999)}"
+        elif roll < 0.04:
+            line = f"Model No. {rng.choice(['CR', 'VLT', 'XZ'])}-{rng.randint(10, 9999)}"
+        elif roll < 0.045:
+            line = f"Manufacturer: {rng.choice(['Acme Pumps', 'Grundfos', 'Daikin Applied', 'Trane'])}"
+        else:
+            line = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(6, 16)))
+        out.append(line)
+        total += len(line) + 1
+    return "\n".join(out)
+
+
+TAG_PREFIXES = ["AHU", "CHW", "BLR", "FCU"]
+MANUFACTURERS = ["Acme Pumps", "Grundfos", "Daikin Applied", "Trane"]
+
+
+def synthetic_register(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """An asset register shaped like a real export, with every cell as text."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        prefix = TAG_PREFIXES[i % len(TAG_PREFIXES)]
+        tag = f"{prefix}-{100 + i}"
+        rows.append({
+            "asset_id": tag,
+            "name": f"{rng.choice(['Chilled water pump', 'Air handling unit', 'Boiler', 'Fan coil unit'])} {tag}",
+            "manufacturer": rng.choice(MANUFACTURERS),
+            "model": f"{rng.choice(['CR', 'VLT', 'XZ'])}-{rng.randint(10, 9999)}",
+            "serial": f"{rng.choice('ABCXYZ')}{rng.randint(10000, 9999999)}",
+            "external_id": f"EXT{i:07d}",
+            "project": f"proj{i % 20}",
+        })
+    return pd.DataFrame(rows, dtype=str)
+
+
+def write_text_pdf(path: str, pages: int, seed: int):
+    """PDF with a real text layer: the PyMuPDF fast path."""
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (40, 40, -40, -40), synthetic_manual_text(3000, seed * 1000 + p), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def write_image_pdf(path: str, pages: int, seed: int):
+    """Scanned-style PDF: each page is a single image with no text layer."""
+    doc = fitz.open()
+    for p in range(pages):
+        img = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(img)
+        for n, line in enumerate(synthetic_manual_text(2500, seed * 1000 + p).splitlines()[:80]):
+            draw.text((60, 60 + n * 20), line, fill="black")
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buf.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def write_docx(path: str, seed: int):
+    """DOCX with prose paragraphs and a nameplate table."""
+    rng = random.Random(seed)
+    doc = Document()
+    for line in synthetic_manual_text(6000, seed).splitlines():
+        doc.add_paragraph(line)
+    table = doc.add_table(rows=4, cols=2)
+    for row, (label, value) in zip(table.rows, [
+        ("Asset Tag", f"{rng.choice(TAG_PREFIXES)}-{rng.randint(100, 99999)}"),
+        ("Manufacturer", rng.choice(MANUFACTURERS)),
+        ("Model No.", f"CR-{rng.randint(10, 9999)}"),
+        ("S/N", f"X{rng.randint(10000, 9999999)}"),
+    ]):
+        row.cells[0].text, row.cells[1].text = label, value
+    doc.save(path)
+
+
+def write_large_pdf(path: str, size_mb: float, seed: int):
+    """
+    PDF of roughly size_mb, like a vendor manual with embedded drawings: a
+    nameplate line of text per page plus an uncompressed 4 MiB noise image,
+    so the file can't shrink below the requested size.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    while written < target:
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Asset Tag: {rng.choice(TAG_PREFIXES)}-{rng.randint(100, 99999)}", fontsize=10)
+        side = min(2048, max(64, int((target - written) ** 0.5)))
+        img = Image.frombytes("L", (side, side), rng.randbytes(side * side))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=0)
+        page.insert_image(fitz.Rect(72, 100, 540, 568), stream=buf.getvalue())
+        written += side * side
+    doc.save(path)
+    doc.close()
+
+
+def build_corpus(root: str, n_files: int, seed: int = 0, pdf_pages: int = 8) -> Dict[str, List[str]]:
+    """
+    Write n_files documents of each kind under root/<project>/ and return
+    {"text_pdf": [...], "image_pdf": [...], "docx": [...]}.
+    """
+    corpus = {"text_pdf": [], "image_pdf": [], "docx": []}
+    for i in range(n_files):
+        folder = os.path.join(root, f"proj{i % 20}")
+        os.makedirs(folder, exist_ok=True)
+        fseed = seed * 100000 + i
+        path = os.path.join(folder, f"manual_{i:04d}.pdf")
+        write_text_pdf(path, pdf_pages, fseed)
+        corpus["text_pdf"].append(path)
+        path = os.path.join(folder, f"scan_{i:04d}.pdf")
+        write_image_pdf(path, 2, fseed)
+        corpus["image_pdf"].append(path)
+        path = os.path.join(folder, f"manual_{i:04d}.docx")
+        write_docx(path, fseed)
+        corpus["docx"].append(path)
+    return corpus
+
+
+# ---------- Reference Implementations ----------
+
+def legacy_find_with_patterns(text: str, patterns: List[str]) -> List[str]:
+    found = []
+    for pat in patterns:
+        for m in re.finditer(pat, text, flags=re.IGNORECASE):
+            if m.groups():
+                val = m.group(1)
+            else:
+                val = m.group(0)
+            val = val.strip().strip(":#- ").upper()
+            if val and val not in found:
+                found.append(val)
+    return found
+
+
+def legacy_parse_identifiers(text: str) -> Dict[str, List[str]]:
+    return {
+        "asset_ids": legacy_find_with_patterns(text, ID_PATTERNS),
+        "serials": legacy_find_with_patterns(text, SERIAL_PATTERNS),
+        "models": legacy_find_with_patterns(text, MODEL_PATTERNS),
+        "manufacturers": legacy_find_with_patterns(text, MANUFACTURER_PATTERNS),
+    }
+
+
+# ---------- Measurement ----------
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, from VmHWM where /proc
+    has it: ru_maxrss carries over the parent's peak into subprocesses.
+    """
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def tesseract_available() -> bool:
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+class Report:
+    """
+    Named metrics for one run. Each metric records whether higher or lower
+    is better so two runs can be compared without knowing the benchmarks.
+    """
+
+    def __init__(self, **meta):
+        self.meta = meta
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str, higher_is_better: bool = True):
+        self.metrics[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print(f"  {name:<44} {value:>12.3f} {unit}")
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"meta": self.meta, "metrics": self.metrics}, fh, indent=2)
+
+
+# ---------- Benchmarks ----------
+
+def bench_parse(size_mb: float, repeat: int, seed: int, report: Report = None):
+    text = synthetic_manual_text(int(size_mb * 1024 * 1024), seed=seed)
+    expected = legacy_parse_identifiers(text)
+    got = parse_identifiers(text)
+    if got != expected:
+        raise SystemExit("parse_identifiers output differs from the legacy implementation")
+
+    legacy = best_of(lambda: legacy_parse_identifiers(text), repeat)
+    current = best_of(lambda: parse_identifiers(text), repeat)
+    mb = len(text) / (1024 * 1024)
+    print(f"parse_identifiers on {mb:.1f} MiB ({sum(len(v) for v in got.values())} distinct signals)")
+    print(f"  legacy   {legacy:8.3f}s  {mb / legacy:8.1f} MiB/s")
+    print(f"  current  {current:8.3f}s  {mb / current:8.1f} MiB/s  ({legacy / current:.1f}x)")
+    if report is not None:
+        report.add("parse.mib_per_s", mb / current, "MiB/s")
+
+
+def bench_extract(corpus: Dict[str, List[str]], repeat: int, report: Report):
+    """files/s for each document kind through extract_text_any."""
+    ocr = tesseract_available()
+    print(f"extract_text_any ({'with' if ocr else 'without'} OCR for image-only PDFs)")
+    for kind, paths in corpus.items():
+        options = {} if ocr or kind != "image_pdf" else {"use_ocr_if_empty": False}
+        secs = best_of(lambda: [extract_text_any(p, **options) for p in paths], repeat)
+        report.add(f"extract.{kind}.files_per_s", len(paths) / secs, "files/s")
+    report.add("extract.peak_rss_mb", peak_rss_mb(), "MiB", higher_is_better=False)
+
+
+def bench_score(corpus: Dict[str, List[str]], register_sizes: List[int], seed: int, report: Report,
+                brute_force_rows: int = 2000):
+    """
+    Scoring throughput in asset x file pairs per second: score_candidate
+    row by row (on at most brute_force_rows rows), then AssetIndex on the
+    full register of each size. The index's fuzzy cache is off so repeats
+    measure cold lookups.
+    """
+    docs = []
+    for path in corpus["text_pdf"] + corpus["docx"]:
+        text = extract_text_any(path)
+        signals = parse_identifiers(text)
+        signals["title_terms"] = guess_title_terms(text)
+        docs.append((file_meta(path), signals))
+
+    print(f"scoring ({len(docs)} files)")
+    register = synthetic_register(min(brute_force_rows, max(register_sizes)), seed)
+    rows = register.to_dict("records")
+    secs = best_of(lambda: [score_candidate(m, r, s) for m, s in docs for r in rows], 1)
+    report.add("score.score_candidate.pairs_per_s", len(docs) * len(rows) / secs, "pairs/s")
+
+    for n in register_sizes:
+        register = synthetic_register(n, seed)
+        t0 = time.perf_counter()
+        index = AssetIndex(register, fuzzy_cache_size=0)
+        report.add(f"score.index_{n}.build_s", time.perf_counter() - t0, "s", higher_is_better=False)
+        secs = best_of(lambda: [index.rank(m, s) for m, s in docs], 3)
+        report.add(f"score.index_{n}.pairs_per_s", len(docs) * n / secs, "pairs/s")
+    report.add("score.peak_rss_mb", peak_rss_mb(), "MiB", higher_is_better=False)
+
+
+def bench_match(corpus: Dict[str, List[str]], register_sizes: List[int], seed: int, report: Report):
+    """
+    End to end match_files_to_assets over the whole corpus for each register
+    size: files/s, asset x file pairs/s and mean per-file stage times.
+    """
+    paths = [p for kind in corpus.values() for p in kind]
+    options = {} if tesseract_available() else {"use_ocr_if_empty": False}
+    print(f"match_files_to_assets ({len(paths)} files)")
+    for n in register_sizes:
+        index = AssetIndex(synthetic_register(n, seed))
+        t0 = time.perf_counter()
+        results = match_files_to_assets(paths, index, **options)
+        secs = time.perf_counter() - t0
+        report.add(f"match.register_{n}.files_per_s", len(paths) / secs, "files/s")
+        report.add(f"match.register_{n}.pairs_per_s", len(paths) * n / secs, "pairs/s")
+        totals = {}
+        for r in results:
+            for stage, t in r.get("timings", {}).items():
+                totals[stage] = totals.get(stage, 0.0) + t
+        for stage, t in sorted(totals.items()):
+            report.add(f"match.register_{n}.{stage[:-2]}_ms_per_file", 1000 * t / len(paths), "ms",
+                       higher_is_better=False)
+    report.add("match.peak_rss_mb", peak_rss_mb(), "MiB", higher_is_better=False)
+
+
+def run_suite(n_files: int, register_sizes: List[int], repeat: int, seed: int, workdir: str = None,
+              json_path: str = None) -> Report:
+    report = Report(
+        python=platform.python_version(), platform=platform.platform(), cpus=os.cpu_count(),
+        files=n_files, registers=register_sizes, seed=seed, ocr=tesseract_available(),
+        created=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        root = workdir or tmp
+        t0 = time.perf_counter()
+        corpus = build_corpus(root, n_files, seed)
+        print(f"corpus: {n_files} files of each kind in {root} ({time.perf_counter() - t0:.1f}s)")
+
+        bench_parse(1.0, repeat, seed, report)
+        bench_extract(corpus, repeat, report)
+        bench_score(corpus, register_sizes, seed, report)
+        bench_match(corpus, register_sizes, seed, report)
+
+    if json_path:
+        report.save(json_path)
+        print(f"wrote {json_path}")
+    return report
+
+
+def rss_child(path: str, mmap_threshold: int = None):
+    """
+    Hash and extract one file the way match_files_to_assets does and print
+    this process's peak RSS as JSON. Run in a fresh process per measurement
+    so each peak belongs to one file and one mode.
+    """
+    before = peak_rss_mb()
+    t0 = time.perf_counter()
+    analyze_file(path, compute_hash=True, mmap_threshold=mmap_threshold, use_ocr_if_empty=False)
+    print(json.dumps({"secs": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb(), "baseline_mb": before}))
+
+
+def bench_rss(sizes_mb: List[float], seed: int, report: Report, workdir: str):
+    """
+    Peak RSS and time to hash and extract one PDF per size bucket, read
+    into memory (buffered) and memory-mapped, each in its own subprocess.
+    """
+    print("peak RSS per file size (hash + extract, one subprocess each)")
+    for size in sizes_mb:
+        path = os.path.join(workdir, f"large_{size:g}mb.pdf")
+        write_large_pdf(path, size, seed)
+        for mode, threshold in (("buffered", None), ("mmap", 1)):
+            cmd = [sys.executable, os.path.abspath(__file__), "rss-child", path]
+            if threshold is not None:
+                cmd += ["--mmap-threshold", str(threshold)]
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            run = json.loads(out.strip().splitlines()[-1])
+            report.add(f"rss.{size:g}mb.{mode}.peak_rss_mb", run["peak_rss_mb"], "MiB", higher_is_better=False)
+            report.add(f"rss.{size:g}mb.{mode}.extra_rss_mb", run["peak_rss_mb"] - run["baseline_mb"], "MiB",
+                       higher_is_better=False)
+            report.add(f"rss.{size:g}mb.{mode}.s", run["secs"], "s", higher_is_better=False)
+        os.remove(path)
+
+
+def compare_runs(baseline_path: str, current_path: str, tolerance: float) -> int:
+    """
+    Print every metric present in both runs with its relative change and
+    return the number that got worse by more than tolerance (0.15 = 15%).
+    """
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)["metrics"]
+    with open(current_path, encoding="utf-8") as fh:
+        current = json.load(fh)["metrics"]
+
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name]["value"], current[name]["value"]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if current[name]["higher_is_better"] else change
+        flag = ""
+        if worse > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<44} {old:>12.3f} -> {new:>12.3f} {current[name]['unit']:<8} {change:+7.1%}{flag}")
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:<44} only in {'baseline' if name in baseline else 'current'}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("parse", help="parse_identifiers vs the per-pattern implementation")
+    p.add_argument("--size-mb", type=float, default=4.0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("suite", help="extraction, parsing, scoring and end-to-end matching on a synthetic corpus")
+    p.add_argument("--files", type=int, default=12, help="documents of each kind")
+    p.add_argument("--registers", default="1000,10000,100000", help="comma-separated register sizes")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", help="write the corpus here instead of a temp dir")
+    p.add_argument("--json", help="save metrics to this file")
+
+    p = sub.add_parser("rss", help="peak RSS per file size bucket, buffered vs memory-mapped")
+    p.add_argument("--sizes-mb", default="1,16,64,256", help="comma-separated file sizes")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", help="write the test files here instead of a temp dir")
+    p.add_argument("--json", help="save metrics to this file")
+
+    p = sub.add_parser("rss-child", help="(internal) one rss measurement")
+    p.add_argument("path")
+    p.add_argument("--mmap-threshold", type=int)
+
+    p = sub.add_parser("compare", help="compare two runs; exits 1 on regression")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown, as a fraction")
+
+    args = ap.parse_args()
+    if args.bench == "parse":
+        bench_parse(args.size_mb, args.repeat, args.seed)
+    elif args.bench == "suite":
+        sizes = [int(n) for n in args.registers.split(",") if n]
+        run_suite(args.files, sizes, args.repeat, args.seed, args.workdir, args.json)
+    elif args.bench == "rss":
+        report = Report(python=platform.python_version(), platform=platform.platform(), seed=args.seed,
+                        created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        with tempfile.TemporaryDirectory() as tmp:
+            bench_rss([float(n) for n in args.sizes_mb.split(",") if n], args.seed, report, args.workdir or tmp)
+        if args.json:
+            report.save(args.json)
+            print(f"wrote {args.json}")
+    elif args.bench == "rss-child":
+        rss_child(args.path, args.mmap_threshold)
+    elif args.bench == "compare":
+        sys.exit(1 if compare_runs(args.baseline, args.current, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
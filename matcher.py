@@ -1,13 +1,26 @@
-
-port os
+import argparse
+import csv
+import glob
+import os
 import re
+import sys
 import io
 import hashlib
+import json
+import mmap
+import multiprocessing
+import sqlite3
+import threading
 import time
-from typing import List, Dict, Tuple, Optional
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, List, Dict, Tuple, Optional
 
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from docx import Document
 
 # PDF imports
@@ -20,69 +33,311 @@ import pytesseract
 
 # ---------- Text Extraction ----------
 
-def extract_text_pdf(path: str, use_ocr_if_empty: bool = True, max_pages_ocr: int = 5) -> str:
+DEFAULT_EXTRACT_OPTIONS = {
+    "use_ocr_if_empty": True,
+    "max_pages_ocr": 5,
+    "max_pages": None,      # stop after this many pages
+    "max_chars": None,      # stop once this much text has been read
+    "stable_pages": 0,      # stop after this many pages add no new signal (0 = off)
+    "min_page_chars": 20,   # pages with less text than this get fallback/OCR
+    "ocr_workers": None,    # concurrent tesseract processes per file (None = one per CPU)
+    "ocr_timeout": None,    # seconds per OCR page (None = no limit)
+    "mmap_threshold": 64 * 1024 * 1024,  # files this big or bigger are mapped, not read (None = never)
+}
+
+# Options that change how fast extraction runs but not what it returns
+RUNTIME_OPTIONS = {"ocr_workers", "mmap_threshold"}
+
+
+def extract_options(**overrides) -> Dict:
+    """Full extraction settings: DEFAULT_EXTRACT_OPTIONS with overrides applied."""
+    unknown = set(overrides) - set(DEFAULT_EXTRACT_OPTIONS)
+    if unknown:
+        raise TypeError(f"unknown extraction options: {', '.join(sorted(unknown))}")
+    return dict(DEFAULT_EXTRACT_OPTIONS, **overrides)
+
+
+def is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_name(source) -> str:
+    """Path of a file source, or the name attribute of an in-memory one."""
+    if is_path(source):
+        return os.fspath(source)
+    return getattr(source, "name", None) or "<memory>"
+
+
+def source_buffer(source):
+    """
+    Contents of an in-memory source (bytes-like or file-like) as a bytes-like
+    object, without copying where the source allows it. Paths pass through.
+    """
+    if is_path(source) or isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    return source.read()
+
+
+def source_stream(source):
+    """A path, or a seekable stream over an in-memory source, for pdfplumber and python-docx."""
+    if is_path(source):
+        return source
+    if isinstance(source, mmap.mmap):
+        source.seek(0)
+        return source
+    return io.BytesIO(source_buffer(source))
+
+
+def is_large(source, mmap_threshold: Optional[int]) -> bool:
+    """Whether source is a file at or over mmap_threshold bytes, to be mapped rather than read."""
+    # Empty files can't be mapped
+    return mmap_threshold is not None and is_path(source) and os.path.getsize(source) >= max(mmap_threshold, 1)
+
+
+def map_file(path: str) -> mmap.mmap:
+    """Read-only memory map of a file; pages are read from disk as they are touched."""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def ocr_image(img: Image.Image, timeout: Optional[float] = None) -> Tuple[str, float]:
+    """OCR one rendered page. Returns (text, seconds spent in tesseract)."""
+    t0 = time.perf_counter()
+    text = pytesseract.image_to_string(img, timeout=timeout or 0)
+    return text, time.perf_counter() - t0
+
+
+_tesseract_found = None
+
+
+def tesseract_found() -> bool:
+    """Whether the tesseract binary can be run; checked once per process."""
+    global _tesseract_found
+    if _tesseract_found is None:
+        try:
+            pytesseract.get_tesseract_version()
+            _tesseract_found = True
+        except pytesseract.TesseractNotFoundError:
+            _tesseract_found = False
+    return _tesseract_found
+
+
+def extract_text_pdf(source, use_ocr_if_empty: bool = True, max_pages_ocr: int = 5,
+                     max_pages: Optional[int] = None, max_chars: Optional[int] = None,
+                     stable_pages: int = 0, min_page_chars: int = 20,
+                     ocr_workers: Optional[int] = None, ocr_timeout: Optional[float] = None,
+                     stats: Optional[Dict] = None, name: Optional[str] = None,
+                     mmap_threshold: Optional[int] = 64 * 1024 * 1024) -> str:
     """
-    Extract text from a PDF. Try normal text first (PyMuPDF). If little or no text,
-    optionally OCR up to max_pages_ocr pages.
+    Extract text from a PDF page by page from a single PyMuPDF document.
+    source is a path or the file's contents (bytes-like or file-like); the
+    latter are read straight from memory, with name used in warnings.
+    Files of mmap_threshold bytes or more are never copied into Python:
+    PyMuPDF reads them by path and pdfplumber through a memory map.
+    A page with less than min_page_chars of text is retried with pdfplumber
+    (opened only if some page needs it), and if still empty it is rendered
+    and OCR'd, up to max_pages_ocr pages per file. Rendering happens here;
+    recognition runs on up to ocr_workers tesseract processes at once, each
+    page limited to ocr_timeout seconds.
+
+    Pages are read in order and reading stops early after max_pages pages or
+    max_chars characters, or once stable_pages pages in a row have added no
+    new identifier signal (pages still waiting on OCR don't count). Page
+    counts (ocr_pages only counts pages tesseract actually read, ocr_failed
+    those it didn't), per-page OCR timings and per-stage times ("timings":
+    open_s, text_s, fallback_s, ocr_render_s, ocr_s) are written to stats if
+    given. If tesseract is missing, no further pages are rendered.
     """
-    text_chunks = []
+    page_texts = []
+    pages_total = 0
+    pages_read = 0
+    stopped_early = False
+    fallback_pages = 0
+    ocr_pages = 0
+    ocr_failed = 0
+    ocr_budget = max_pages_ocr if use_ocr_if_empty else 0
+    ocr_pool = None
+    ocr_jobs = []  # (slot in page_texts, page number, render seconds, future)
+    ocr_timings = []
+    plumber = None
+    timings = defaultdict(float)
+    path = name or source_name(source)
+    data = source_buffer(source)
+    mapped = is_large(data, mmap_threshold)
+    if mapped:
+        # PyMuPDF copies stream input, so it keeps the path; pdfplumber gets the map
+        data = map_file(data)
+        doc_source = source
+    elif isinstance(data, (bytes, bytearray)):
+        doc_source = data
+    else:
+        # PyMuPDF < 1.26 rejects memoryview streams (e.g. a BytesIO's getbuffer())
+        doc_source = bytes(data)
 
+    t0 = time.perf_counter()
     try:
-        with fitz.open(path) as doc:
-            for page in doc:
-                text = page.get_text("text")
-                if text and text.strip():
-                    text_chunks.append(text)
+        doc = fitz.open(doc_source) if is_path(doc_source) else fitz.open(stream=doc_source, filetype="pdf")
     except Exception as e:
         print(f"[WARN] PyMuPDF failed on {path}: {e}")
+        doc = None
+    timings["open_s"] += time.perf_counter() - t0
 
-    text = "\n".join(text_chunks).strip()
-
-    # If text is too short, try pdfplumber as fallback
-    if len(text) < 100:
+    if doc is None:
+        # PyMuPDF could not open the file at all; pdfplumber is the only option
+        t0 = time.perf_counter()
         try:
-            with pdfplumber.open(path) as pdf:
-                for page in pdf.pages:
+            with pdfplumber.open(source_stream(data)) as pdf:
+                pages_total = len(pdf.pages)
+                for page in pdf.pages[:max_pages]:
                     t = page.extract_text() or ""
+                    pages_read += 1
                     if t.strip():
-                        text_chunks.append(t)
-            text = "\n".join(text_chunks).strip()
+                        page_texts.append(t)
         except Exception as e:
             print(f"[WARN] pdfplumber failed on {path}: {e}")
-
-    # OCR if still minimal
-    if use_ocr_if_empty and len(text) < 100:
+        timings["fallback_s"] += time.perf_counter() - t0
+    else:
         try:
-            ocr_texts = []
-            with fitz.open(path) as doc:
-                pages_to_ocr = min(len(doc), max_pages_ocr)
-                for i in range(pages_to_ocr):
-                    page = doc.load_page(i)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # upscale for OCR quality
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    ocr_texts.append(pytesseract.image_to_string(img))
-            text = "\n".join(ocr_texts).strip()
+            pages_total = len(doc)
+            chars = 0
+            seen = set()
+            quiet = 0
+            for page in doc:
+                if (max_pages is not None and pages_read >= max_pages) or \
+                        (max_chars is not None and chars >= max_chars):
+                    stopped_early = True
+                    break
+                t0 = time.perf_counter()
+                text = page.get_text("text") or ""
+                pages_read += 1
+                timings["text_s"] += time.perf_counter() - t0
+
+                # No usable text layer: try pdfplumber on this page only
+                if len(text.strip()) < min_page_chars:
+                    t0 = time.perf_counter()
+                    if plumber is None:
+                        try:
+                            plumber = pdfplumber.open(source_stream(data))
+                        except Exception as e:
+                            print(f"[WARN] pdfplumber failed on {path}: {e}")
+                            plumber = False
+                    if plumber:
+                        try:
+                            t = plumber.pages[page.number].extract_text() or ""
+                            fallback_pages += 1
+                            if len(t.strip()) > len(text.strip()):
+                                text = t
+                        except Exception as e:
+                            print(f"[WARN] pdfplumber failed on {path} page {page.number + 1}: {e}")
+                    timings["fallback_s"] += time.perf_counter() - t0
+
+                # No tesseract (or a finished job says so): nothing more to render
+                needs_ocr = len(text.strip()) < min_page_chars and len(ocr_jobs) < ocr_budget
+                if needs_ocr and (not tesseract_found() or any(
+                        f.done() and isinstance(f.exception(), pytesseract.TesseractNotFoundError)
+                        for *_, f in ocr_jobs)):
+                    if not ocr_jobs:
+                        print(f"[WARN] OCR skipped on {path}: tesseract is not installed or not in PATH")
+                    ocr_budget = 0
+                    ocr_failed += 1
+                    needs_ocr = False
+
+                # Still nothing: render this page and queue it for OCR
+                if needs_ocr:
+                    try:
+                        t0 = time.perf_counter()
+                        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # upscale for OCR quality
+                        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                        render_s = time.perf_counter() - t0
+                        timings["ocr_render_s"] += render_s
+                        if ocr_pool is None:
+                            ocr_pool = ThreadPoolExecutor(max_workers=ocr_workers or os.cpu_count() or 1)
+                        fut = ocr_pool.submit(ocr_image, img, ocr_timeout)
+                        ocr_jobs.append((len(page_texts), page.number, render_s, fut))
+                        page_texts.append(text)
+                        continue
+                    except Exception as e:
+                        print(f"[WARN] OCR render failed on {path} page {page.number + 1}: {e}")
+                        ocr_failed += 1
+
+                page_texts.append(text)
+                chars += len(text)
+
+                if stable_pages:
+                    found = {(k, v) for k, vals in parse_identifiers(text).items() for v in vals}
+                    if found - seen:
+                        seen |= found
+                        quiet = 0
+                    elif seen:
+                        quiet += 1
+                    if seen and quiet >= stable_pages and pages_read < pages_total:
+                        stopped_early = True
+                        break
+
+            for i, (slot, page_no, render_s, fut) in enumerate(ocr_jobs):
+                try:
+                    t, ocr_s = fut.result()
+                    if t.strip():
+                        page_texts[slot] = t
+                    ocr_pages += 1
+                    ocr_timings.append({"page": page_no + 1, "render_s": render_s, "ocr_s": ocr_s})
+                    timings["ocr_s"] += ocr_s
+                except pytesseract.TesseractNotFoundError as e:
+                    print(f"[WARN] OCR failed on {path} page {page_no + 1}: {e}")
+                    for *_, rest in ocr_jobs[i + 1:]:
+                        rest.cancel()
+                    ocr_failed += len(ocr_jobs) - i
+                    break
+                except Exception as e:
+                    print(f"[WARN] OCR failed on {path} page {page_no + 1}: {e}")
+                    ocr_failed += 1
         except Exception as e:
-            print(f"[WARN] OCR failed on {path}: {e}")
+            print(f"[WARN] PyMuPDF failed on {path}: {e}")
+        finally:
+            doc.close()
+            if plumber:
+                plumber.close()
+            if ocr_pool is not None:
+                ocr_pool.shutdown(wait=False, cancel_futures=True)
+    if mapped:
+        data.close()  # the map made above
 
-    return text
+    if stats is not None:
+        stats.update(
+            pages_total=pages_total, pages_read=pages_read, stopped_early=stopped_early,
+            fallback_pages=fallback_pages, ocr_pages=ocr_pages, ocr_failed=ocr_failed, ocr=ocr_timings,
+            timings=dict(timings),
+        )
+    return "\n".join(t for t in page_texts if t.strip()).strip()
 
 
-def extract_text_docx(path: str) -> str:
+def extract_text_docx(source, name: Optional[str] = None, stats: Optional[Dict] = None) -> str:
+    t0 = time.perf_counter()
     try:
-        doc = Document(path)
+        doc = Document(source_stream(source))
         return "\n".join(p.text for p in doc.paragraphs)
     except Exception as e:
-        print(f"[WARN] DOCX extraction failed on {path}: {e}")
+        print(f"[WARN] DOCX extraction failed on {name or source_name(source)}: {e}")
         return ""
+    finally:
+        if stats is not None:
+            stats["timings"] = {"docx_s": time.perf_counter() - t0}
 
 
-def extract_text_any(path: str) -> str:
-    ext = os.path.splitext(path)[1].lower()
+def extract_text_any(source, stats: Optional[Dict] = None, name: Optional[str] = None, **options) -> str:
+    """
+    Extract text by file extension. source is a path or the file's contents
+    (bytes-like or file-like); name supplies the extension for contents
+    without a name. options are the DEFAULT_EXTRACT_OPTIONS keys and only
+    apply to PDFs.
+    """
+    ext = os.path.splitext(name or source_name(source))[1].lower()
     if ext == ".pdf":
-        return extract_text_pdf(path)
+        return extract_text_pdf(source, stats=stats, name=name, **options)
     elif ext in (".docx",):
-        return extract_text_docx(path)
+        return extract_text_docx(source, name=name, stats=stats)
     else:
         return ""
 
@@ -111,27 +366,70 @@ MANUFACTURER_PATTERNS = [
     r'\bMade by[:\s]*([A-Za-z0-9&\-\., ]{2,50})\b',
 ]
 
-def find_with_patterns(text: str, patterns: List[str]) -> List[str]:
-    found = []
+SIGNAL_PATTERNS = {
+    "asset_ids": ID_PATTERNS,
+    "serials": SERIAL_PATTERNS,
+    "models": MODEL_PATTERNS,
+    "manufacturers": MANUFACTURER_PATTERNS,
+}
+
+COMPILED_PATTERNS = {
+    kind: [re.compile(p, re.IGNORECASE) for p in pats] for kind, pats in SIGNAL_PATTERNS.items()
+}
+
+# Every pattern above starts at a word boundary followed by one of these, so a
+# single scan for these positions finds every place any pattern can match.
+SIGNAL_START_RE = re.compile(
+    r'\b(?=[A-Z]{2,5}[-\s]?\d|S\/?N|SERIAL|MODEL|TYPE|MANUFACTURER|MADE BY)',
+    re.IGNORECASE,
+)
+
+
+def _clean(m: re.Match) -> str:
+    val = m.group(1) if m.groups() else m.group(0)
+    return val.strip().strip(":#- ").upper()
+
+
+def find_with_patterns(text: str, patterns: List) -> List[str]:
+    found = {}
     for pat in patterns:
-        for m in re.finditer(pat, text, flags=re.IGNORECASE):
-            if m.groups():
-                val = m.group(1)
-            else:
-                val = m.group(0)
-            val = val.strip().strip(":#- ").upper()
-            if val and val not in found:
-                found.append(val)
-    return found
+        if isinstance(pat, str):
+            pat = re.compile(pat, re.IGNORECASE)
+        for m in pat.finditer(text):
+            val = _clean(m)
+            if val:
+                found[val] = None
+    return list(found)
 
 
 def parse_identifiers(text: str) -> Dict[str, List[str]]:
-    return {
-        "asset_ids": find_with_patterns(text, ID_PATTERNS),
-        "serials": find_with_patterns(text, SERIAL_PATTERNS),
-        "models": find_with_patterns(text, MODEL_PATTERNS),
-        "manufacturers": find_with_patterns(text, MANUFACTURER_PATTERNS),
-    }
+    """
+    One scan over text for candidate start positions, then each precompiled
+    pattern is tried anchored at those positions. Gives the same values in
+    the same order as running each pattern's finditer in turn.
+    """
+    compiled = [(kind, pat) for kind, pats in COMPILED_PATTERNS.items() for pat in pats]
+    hits = [[] for _ in compiled]
+    next_start = [0] * len(compiled)
+
+    for start in SIGNAL_START_RE.finditer(text):
+        pos = start.start()
+        for j, (_, pat) in enumerate(compiled):
+            # finditer never returns overlapping matches of one pattern
+            if pos < next_start[j]:
+                continue
+            m = pat.match(text, pos)
+            if m:
+                hits[j].append(m)
+                next_start[j] = m.end()
+
+    found = {kind: {} for kind in COMPILED_PATTERNS}
+    for (kind, _), matches in zip(compiled, hits):
+        for m in matches:
+            val = _clean(m)
+            if val:
+                found[kind][val] = None
+    return {kind: list(vals) for kind, vals in found.items()}
 
 
 # ---------- Normalization ----------
@@ -145,38 +443,186 @@ def normalize(s: Optional[str]) -> str:
     return s
 
 
-def file_hash(path: str, algo: str = "sha256", chunk: int = 1024 * 1024) -> str:
+def read_source(source, mmap_threshold: Optional[int] = DEFAULT_EXTRACT_OPTIONS["mmap_threshold"]):
+    """
+    A document's contents from a single read: paths are read into bytes and
+    in-memory sources become a bytes-like buffer (a file-like object without
+    getbuffer() is read here, so call this once per source). Hash, stat and
+    extract from the result so the file is only read once. Files of
+    mmap_threshold bytes or more are left as paths; file_hash and
+    extract_text_pdf memory-map those instead.
+    """
+    if not is_path(source):
+        return source_buffer(source)
+    if not is_large(source, mmap_threshold):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+
+def file_hash(source, algo: str = "sha256", chunk: int = 1024 * 1024,
+              mmap_threshold: Optional[int] = DEFAULT_EXTRACT_OPTIONS["mmap_threshold"]) -> str:
+    """
+    Hex digest of a file or in-memory contents. Files of mmap_threshold bytes
+    or more are hashed through a memory map in 16 MiB windows, each dropped
+    from this process once hashed so resident memory stays flat.
+    """
+    if not is_path(source):
+        return hashlib.new(algo, source_buffer(source)).hexdigest()
     h = hashlib.new(algo)
-    with open(path, "rb") as f:
+    if is_large(source, mmap_threshold):
+        window = 16 * 1024 * 1024
+        with map_file(source) as mm:
+            for offset in range(0, len(mm), window):
+                size = min(window, len(mm) - offset)
+                with memoryview(mm)[offset:offset + size] as view:
+                    h.update(view)
+                if hasattr(mmap, "MADV_DONTNEED"):
+                    mm.madvise(mmap.MADV_DONTNEED, offset, size)
+        return h.hexdigest()
+    with open(source, "rb") as f:
         for block in iter(lambda: f.read(chunk), b''):
             h.update(block)
     return h.hexdigest()
 
 
+# ---------- Extraction Cache ----------
+
+# Bump whenever extraction or parsing changes output, so old cache entries miss
+EXTRACTOR_VERSION = "2"
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted text and parsed signals, keyed by the file's
+    sha256 plus extractor version and settings (the full extract_options
+    dict). Extraction stats (pages read) are kept alongside so cached
+    results report the same; extractions where OCR failed are not stored.
+    Backed by one SQLite file;
+    least recently used entries are evicted once the stored (compressed)
+    size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2 * 1024 ** 3):
+        if os.path.isdir(path):
+            path = os.path.join(path, "extraction_cache.sqlite")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, text BLOB, signals TEXT, extraction TEXT,"
+            " size INTEGER, last_access REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(digest: str, **settings) -> str:
+        settings = {k: v for k, v in settings.items() if k not in RUNTIME_OPTIONS}
+        return f"{digest}:{EXTRACTOR_VERSION}:{json.dumps(settings, sort_keys=True)}"
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict, Dict]]:
+        row = self.conn.execute("SELECT text, signals, extraction FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return zlib.decompress(row[0]).decode("utf-8"), json.loads(row[1]), json.loads(row[2])
+
+    def put(self, key: str, text: str, signals: Dict, extraction: Optional[Dict] = None):
+        if extraction and extraction.get("ocr_failed"):
+            return  # a page came back empty only because OCR failed; try again next run
+        blob = zlib.compress(text.encode("utf-8"))
+        sig = json.dumps(signals)
+        # Timings, per-page OCR times included, describe the run that extracted, not later hits
+        info = json.dumps({k: v for k, v in (extraction or {}).items() if k not in ("timings", "ocr")})
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, text, signals, extraction, size, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, blob, sig, info, len(blob) + len(sig) + len(info), time.time()),
+        )
+        self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> Dict:
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        self.conn.close()
+
+
 # ---------- Scoring ----------
 
-def score_candidate(file_meta: Dict, asset_row: Dict, signals: Dict) -> Tuple[int, List[str]]:
+ASSET_TOKEN_RE = re.compile(r'[A-Z]{2,5}-\d{3,8}|[A-Z]{2,5}\d{3,8}')
+
+# Register columns searched for asset ID tokens
+ASSET_ID_COLUMNS = ("asset_id", "external_id", "tag", "name")
+
+
+def cell_text(value) -> str:
+    """A register cell as text; None and NaN (pandas' missing value) read as ''."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+def id_tokens(value: str) -> List[str]:
+    return ASSET_TOKEN_RE.findall(value.upper()) if value else []
+
+
+def asset_features(asset_row: Dict) -> Dict:
+    """
+    Pre-compute everything score_candidate compares on the asset side
+    (ID tokens, upper-cased serial/model, normalized manufacturer/name).
+    Missing cells read as empty, so they never match.
+    """
+    tokens = set()
+    for col in ASSET_ID_COLUMNS:
+        tokens.update(id_tokens(cell_text(asset_row.get(col))))
+    return {
+        "id_tokens": frozenset(tokens),
+        "serial": cell_text(asset_row.get("serial")).upper(),
+        "model": cell_text(asset_row.get("model")).upper(),
+        "manufacturer": normalize(cell_text(asset_row.get("manufacturer"))),
+        "name": normalize(cell_text(asset_row.get("name"))),
+        "project": cell_text(asset_row.get("project")),
+        "file_hash": cell_text(asset_row.get("file_hash")),
+    }
+
+
+def score_features(file_meta: Dict, feats: Dict, signals: Dict) -> Tuple[int, List[str]]:
     score = 0
     reasons = []
 
     # Exact ID match
-    candidate_ids = set(signals["asset_ids"])
-    asset_tokens = set()
-    for col in ("asset_id", "external_id", "tag", "name"):
-        if col in asset_row and asset_row[col]:
-            asset_tokens |= set(re.findall(r'[A-Z]{2,5}-\d{3,8}|[A-Z]{2,5}\d{3,8}', str(asset_row[col]).upper()))
-    if candidate_ids & asset_tokens:
+    if feats["id_tokens"] & set(signals["asset_ids"]):
         score += 50
         reasons.append("id_match")
 
     # Serial match
-    asset_serial = str(asset_row.get("serial", "")).upper()
+    asset_serial = feats["serial"]
     if asset_serial:
         if asset_serial in signals["serials"]:
             score += 25; reasons.append("serial_match")
 
     # Model match
-    asset_model = str(asset_row.get("model", "")).upper()
+    asset_model = feats["model"]
     if asset_model:
         if asset_model in signals["models"]:
             score += 20; reasons.append("model_match")
@@ -187,30 +633,643 @@ def score_candidate(file_meta: Dict, asset_row: Dict, signals: Dict) -> Tuple[in
                     score += 15; reasons.append("model_partial"); break
 
     # Manufacturer match
-    asset_mfr = normalize(asset_row.get("manufacturer", ""))
+    asset_mfr = feats["manufacturer"]
     for m in signals["manufacturers"]:
         if fuzz.token_set_ratio(asset_mfr, normalize(m)) >= 90:
             score += 10; reasons.append("manufacturer")
 
     # Fuzzy name match (title-like)
     if signals.get("title_terms"):
-        sim = fuzz.token_set_ratio(normalize(asset_row.get("name", "")), normalize(signals["title_terms"]))
+        sim = fuzz.token_set_ratio(feats["name"], normalize(signals["title_terms"]))
         if sim >= 90:
             score += 20; reasons.append(f"fuzzy_name_{sim}")
         elif sim >= 80:
             score += 10; reasons.append(f"fuzzy_name_{sim}")
 
     # Folder/project hint
-    if asset_row.get("project") and asset_row["project"] and asset_row["project"].lower() in file_meta["dir"].lower():
+    project = feats["project"]
+    if project and project.lower() in file_meta["dir"].lower():
         score += 10; reasons.append("folder_hint")
 
     # Hash bonus (if provided)
-    if file_meta.get("hash") and asset_row.get("file_hash") and file_meta["hash"] == asset_row["file_hash"]:
+    if file_meta.get("hash") and feats["file_hash"] and file_meta["hash"] == feats["file_hash"]:
         score = max(score, 100); reasons.append("hash_match")
 
     return score, reasons
 
 
+def score_candidate(file_meta: Dict, asset_row: Dict, signals: Dict) -> Tuple[int, List[str]]:
+    return score_features(file_meta, asset_features(asset_row), signals)
+
+
+def candidate_record(asset_row: Dict, score: int, reasons: List[str]) -> Dict:
+    return {
+        "asset_id": asset_row.get("asset_id", None),
+        "name": asset_row.get("name", ""),
+        "score": score,
+        "reasons": ", ".join(reasons) if reasons else "",
+        "manufacturer": asset_row.get("manufacturer", ""),
+        "model": asset_row.get("model", ""),
+        "serial": asset_row.get("serial", ""),
+        "external_id": asset_row.get("external_id", ""),
+        "project": asset_row.get("project", ""),
+    }
+
+
+class PackedStrings:
+    """
+    Strings packed end to end into one UTF-8 buffer, with an offsets array
+    marking where each starts: a row costs its own length plus 4 bytes
+    (8 once the buffer passes 4 GB).
+    """
+
+    def __init__(self, values: List[str]):
+        encoded = [v.encode("utf-8") for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        ends = np.cumsum(lengths)
+        dtype = np.uint32 if not len(ends) or ends[-1] < 2 ** 32 else np.int64
+        self.offsets = np.zeros(len(encoded) + 1, dtype=dtype)
+        self.offsets[1:] = ends
+        self.buffer = b"".join(encoded)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer) + self.offsets.nbytes
+
+
+class AssetTable:
+    """
+    Asset register as compact typed columns, with missing cells as "".
+    Columns with repeated values (manufacturers, models, projects) are pandas
+    categoricals, so each distinct string is stored once and rows hold small
+    integer codes. Mostly-unique columns (asset IDs, serials, free text) are
+    PackedStrings instead of a Python string per row.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self.data = {}
+        self._row_hashes = None
+        for col in df.columns:
+            values = [cell_text(v) for v in df[col]]
+            cat = pd.Categorical(values)
+            if len(cat.categories) * 2 > max(len(values), 1):
+                self.data[str(col)] = PackedStrings(values)
+            else:
+                self.data[str(col)] = cat
+
+    @classmethod
+    def from_file(cls, source, name: Optional[str] = None) -> "AssetTable":
+        """Load a CSV/XLSX register from a path or file-like object, every cell as text."""
+        name = name or str(source)
+        if name.lower().endswith((".xlsx", ".xls")):
+            df = pd.read_excel(source, dtype=str)
+        else:
+            df = pd.read_csv(source, dtype=str)
+        return cls(df)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.data)
+
+    def codes(self, col: str) -> Tuple[np.ndarray, List[str]]:
+        """(codes, categories) for a column; codes are all -1 if it is absent."""
+        values = self.data.get(col)
+        if values is None:
+            return np.full(self.n_rows, -1, dtype=np.int32), []
+        if isinstance(values, pd.Categorical):
+            return values.codes.astype(np.int32), list(values.categories)
+        cat = pd.Categorical(values.tolist())
+        return cat.codes.astype(np.int32), list(cat.categories)
+
+    def value(self, col: str, i: int) -> str:
+        return self.data[col][i]
+
+    def row(self, i: int) -> Dict[str, str]:
+        return {col: self.value(col, i) for col in self.data}
+
+    def row_hash(self, i: int) -> str:
+        """Content hash of one row; identical rows hash the same wherever they sit."""
+        row = self.row(i)
+        return hashlib.sha1(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def row_hashes(self) -> List[str]:
+        """All row hashes, computed once per table."""
+        if self._row_hashes is None:
+            self._row_hashes = [self.row_hash(i) for i in range(self.n_rows)]
+        return self._row_hashes
+
+    def subset(self, rows: List[int]) -> "AssetTable":
+        return AssetTable(pd.DataFrame([self.row(i) for i in rows], columns=self.columns))
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return pd.DataFrame([self.row(i) for i in range(min(n, self.n_rows))], columns=self.columns)
+
+    def memory_bytes(self) -> int:
+        total = 0
+        for values in self.data.values():
+            if isinstance(values, pd.Categorical):
+                total += values.codes.nbytes + int(values.categories.memory_usage(deep=True))
+            else:
+                total += values.nbytes
+        return total
+
+
+def _recode(table: AssetTable, col: str, fn, keep=bool) -> Tuple[np.ndarray, List]:
+    """
+    Map a column's categories through fn and dictionary-encode the result:
+    returns (codes, distinct) where codes[i] is the 1-based position of
+    fn(value of row i) in distinct, or 0 when keep(that value) is false.
+    """
+    codes, categories = table.codes(col)
+    lookup = {}
+    distinct = []
+    remap = np.zeros(len(categories) + 1, dtype=np.int32)  # slot 0 is the absent column
+    for j, v in enumerate(categories):
+        v = fn(v)
+        if not keep(v):
+            continue
+        code = lookup.get(v)
+        if code is None:
+            distinct.append(v)
+            code = lookup[v] = len(distinct)
+        remap[j + 1] = code
+    return remap[codes + 1], distinct
+
+
+def top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indexes of the k highest scores, highest first and ties in row order -
+    the same rows a stable descending sort would put first.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.intp)
+
+    # Only rows that scored at all compete; usually a handful out of the register
+    rows = np.flatnonzero(scores)
+    if len(rows) > k:
+        vals = scores[rows]
+        kth = vals[np.argpartition(-vals, k - 1)[k - 1]]
+        above = rows[vals > kth]
+        rows = np.concatenate([above, rows[vals == kth][:k - len(above)]])
+    rows = rows[np.lexsort((rows, -scores[rows]))]
+
+    # Fewer than k scored: the first zero-score rows fill up, in register order
+    if len(rows) < k:
+        rows = np.concatenate([rows, np.flatnonzero(scores == 0)[:k - len(rows)]])
+    return rows
+
+
+class AssetIndex:
+    """
+    Asset register (an AssetTable, or a DataFrame converted to one) digested
+    once for matching, held as column arrays. Each
+    scored column (serial, model, manufacturer, name, project, file hash) is
+    dictionary-encoded, so a file's score for every asset is a few table
+    lookups over the distinct values followed by NumPy gathers. ID tokens
+    map straight to the rows that carry them.
+
+    Fuzzy manufacturer and name scores come from rapidfuzz's process.cdist
+    over the distinct normalized values, one matrix per batch of files,
+    spread over fuzzy_workers threads (-1 = all cores). The resulting
+    per-distinct-value score column for each manufacturer signal and title
+    is kept in an LRU cache (fuzzy_cache_size entries each) shared by all
+    files scored against this index; it is locked, so one index can serve
+    several threads.
+
+    Scores, reasons and candidate order are the same as scoring every row
+    with score_candidate and stable-sorting by score.
+    """
+
+    def __init__(self, assets, fuzzy_workers: int = -1, fuzzy_cache_size: int = 256):
+        self.table = assets if isinstance(assets, AssetTable) else AssetTable(assets)
+        self.fuzzy_workers = fuzzy_workers
+        self.fuzzy_cache_size = fuzzy_cache_size
+        self._mfr_cache = OrderedDict()
+        self._name_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        table = self.table
+
+        # ID tokens per distinct cell value, then to the rows holding that value
+        by_id_token = defaultdict(list)
+        for col in ASSET_ID_COLUMNS:
+            codes, categories = table.codes(col)
+            if not categories:
+                continue
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+            for j, v in enumerate(categories):
+                toks = id_tokens(v)
+                if toks and bounds[j] < bounds[j + 1]:
+                    rows = order[bounds[j]:bounds[j + 1]]
+                    for tok in toks:
+                        by_id_token[tok].append(rows)
+        self.by_id_token = {
+            tok: np.unique(np.concatenate(parts)) for tok, parts in by_id_token.items()
+        }
+
+        upper = lambda v: v.upper()
+        everything = lambda v: True
+        self.serial_codes, self.serials = _recode(table, "serial", upper)
+        self.serial_lookup = {v: i + 1 for i, v in enumerate(self.serials)}
+        self.model_codes, self.models = _recode(table, "model", upper)
+        self.model_lookup = {v: i + 1 for i, v in enumerate(self.models)}
+        self.mfr_codes, self.manufacturers = _recode(table, "manufacturer", normalize, keep=everything)
+        self.name_codes, self.names = _recode(table, "name", normalize, keep=everything)
+        self.project_codes, self.projects = _recode(table, "project", str)
+        self.hash_codes, hashes = _recode(table, "file_hash", str)
+        self.hash_lookup = {h: i + 1 for i, h in enumerate(hashes)}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _similarity(self, values: List[str], queries: List[str], cutoff: int) -> np.ndarray:
+        """token_set_ratio(value, query) for every pair; below cutoff reads as 0."""
+        return process.cdist(
+            values, queries, scorer=fuzz.token_set_ratio, score_cutoff=cutoff,
+            dtype=np.float64, workers=self.fuzzy_workers,
+        )
+
+    def _cached_columns(self, cache: OrderedDict, queries: List[str], compute) -> Dict[str, np.ndarray]:
+        """
+        Look queries up in an LRU cache, computing all misses with one compute
+        call. The cache is only touched under the lock; the computation runs
+        outside it.
+        """
+        with self._cache_lock:
+            found = {q: cache[q] for q in queries if q in cache}
+        misses = [q for q in dict.fromkeys(queries) if q not in found]
+        if misses:
+            found.update(zip(misses, compute(misses)))
+        with self._cache_lock:
+            for q in queries:
+                cache[q] = found[q]
+                cache.move_to_end(q)
+            while len(cache) > self.fuzzy_cache_size:
+                cache.popitem(last=False)
+        return found
+
+    def _manufacturer_columns(self, queries: List[str]) -> List[np.ndarray]:
+        sims = self._similarity(self.manufacturers, queries, 90)
+        return [np.ascontiguousarray(col) for col in (sims >= 90).T]
+
+    def _name_columns(self, queries: List[str]) -> List[np.ndarray]:
+        sims = self._similarity(self.names, queries, 80)
+        table = np.where(sims >= 90, 20, np.where(sims >= 80, 10, 0)).astype(np.int8)
+        return [np.ascontiguousarray(col) for col in table.T]
+
+    def score_vectors(self, metas: List[Dict], signals_list: List[Dict]) -> List[np.ndarray]:
+        """
+        score_candidate's score for every asset row, one int32 array per file.
+        Similarity is computed once per distinct (asset value, signal) pair:
+        signals are deduplicated across the batch, cached across batches, and
+        the per-distinct-value result is broadcast to rows by code.
+        """
+        mfr_queries = list(dict.fromkeys(
+            normalize(m) for signals in signals_list for m in signals["manufacturers"]
+        ))
+        mfr_cols = self._cached_columns(self._mfr_cache, mfr_queries, self._manufacturer_columns)
+
+        titles = list(dict.fromkeys(
+            normalize(signals["title_terms"]) for signals in signals_list if signals.get("title_terms")
+        ))
+        name_cols = self._cached_columns(self._name_cache, titles, self._name_columns)
+
+        vectors = []
+        for meta, signals in zip(metas, signals_list):
+            mfr_table = None
+            if signals["manufacturers"]:
+                mfr_table = 10 * sum(mfr_cols[normalize(m)].astype(np.int32) for m in signals["manufacturers"])
+            name_table = None
+            if signals.get("title_terms"):
+                name_table = name_cols[normalize(signals["title_terms"])]
+            vectors.append(self._score_vector(meta, signals, mfr_table, name_table))
+        return vectors
+
+    def score_vector(self, file_meta: Dict, signals: Dict) -> np.ndarray:
+        """score_candidate's score for every asset row, as one int32 array."""
+        return self.score_vectors([file_meta], [signals])[0]
+
+    def _score_vector(self, file_meta: Dict, signals: Dict, mfr_table: Optional[np.ndarray],
+                      name_table: Optional[np.ndarray]) -> np.ndarray:
+        scores = np.zeros(len(self.table), dtype=np.int32)
+
+        # Exact ID match
+        for tok in set(signals["asset_ids"]):
+            rows = self.by_id_token.get(tok)
+            if rows is not None:
+                scores[rows] = 50
+
+        # Serial match
+        table = np.zeros(len(self.serials) + 1, dtype=np.int32)
+        for s in signals["serials"]:
+            table[self.serial_lookup.get(s, 0)] = 25
+        table[0] = 0
+        scores += table[self.serial_codes]
+
+        # Model match, exact or loose contain
+        models = signals["models"]
+        loose = [m for m in models if len(m) >= 4]
+        if loose:
+            table = np.array([0] + [
+                15 if any(m in v or v in m for m in loose) else 0 for v in self.models
+            ], dtype=np.int32)
+        else:
+            table = np.zeros(len(self.models) + 1, dtype=np.int32)
+        for m in models:
+            table[self.model_lookup.get(m, 0)] = 20
+        table[0] = 0
+        scores += table[self.model_codes]
+
+        # Manufacturer match, once per signal that matches
+        if mfr_table is not None:
+            scores += np.concatenate([[0], mfr_table]).astype(np.int32)[self.mfr_codes]
+
+        # Fuzzy name match (title-like)
+        if name_table is not None:
+            scores += np.concatenate([[0], name_table]).astype(np.int32)[self.name_codes]
+
+        # Folder/project hint
+        folder = file_meta["dir"].lower()
+        table = np.array([0] + [10 if v.lower() in folder else 0 for v in self.projects], dtype=np.int32)
+        scores += table[self.project_codes]
+
+        # Hash bonus
+        code = self.hash_lookup.get(file_meta["hash"]) if file_meta.get("hash") else None
+        if code is not None:
+            hit = self.hash_codes == code
+            scores[hit] = np.maximum(scores[hit], 100)
+        return scores
+
+    def candidates(self, file_meta: Dict, signals: Dict, rows) -> List[Tuple[int, Dict]]:
+        """(row, candidate record) for the given rows, in the order given."""
+        top = []
+        for i in rows:
+            # Reasons only for the rows kept; score_features gives the same score
+            row = self.table.row(i)
+            sc, reasons = score_features(file_meta, asset_features(row), signals)
+            top.append((int(i), candidate_record(row, sc, reasons)))
+        return top
+
+    def rank(self, file_meta: Dict, signals: Dict, k: int = 5) -> List[Tuple[int, Dict]]:
+        scores = self.score_vector(file_meta, signals)
+        return self.candidates(file_meta, signals, top_rows(scores, k))
+
+    def rank_batch(self, metas: List[Dict], signals_list: List[Dict], k: int = 5) -> List[List[Tuple[int, Dict]]]:
+        vectors = self.score_vectors(metas, signals_list)
+        return [self.candidates(m, s, top_rows(v, k)) for m, s, v in zip(metas, signals_list, vectors)]
+
+    def top_candidates(self, file_meta: Dict, signals: Dict, k: int = 5) -> List[Dict]:
+        return [c for _, c in self.rank(file_meta, signals, k)]
+
+    def top_candidates_batch(self, metas: List[Dict], signals_list: List[Dict], k: int = 5) -> List[List[Dict]]:
+        return [[c for _, c in ranked] for ranked in self.rank_batch(metas, signals_list, k)]
+
+
+# ---------- Match Store ----------
+
+class MatchStore:
+    """
+    SQLite record of a matching run: per file its meta, signals, extraction
+    stats, result and the row hashes of its top candidates, plus the row
+    hashes of the register it was scored against. Lets a register revision
+    be re-matched without touching the documents (see rematch_assets).
+    """
+
+    def __init__(self, path: str):
+        if os.path.isdir(path):
+            path = os.path.join(path, "match_store.sqlite")
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_path TEXT PRIMARY KEY, meta TEXT, signals TEXT, extraction TEXT,"
+            " top_rows TEXT, result TEXT)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS register (position INTEGER PRIMARY KEY, row_hash TEXT)")
+        self.conn.commit()
+
+    def save_register(self, row_hashes: List[str]):
+        self.conn.execute("DELETE FROM register")
+        self.conn.executemany("INSERT INTO register VALUES (?, ?)", enumerate(row_hashes))
+        self.conn.commit()
+
+    def register(self) -> List[str]:
+        return [h for (h,) in self.conn.execute("SELECT row_hash FROM register ORDER BY position")]
+
+    def save(self, meta: Dict, signals: Dict, extraction: Dict, result: Dict, top_hashes: List[str]):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (meta["file_path"], json.dumps(meta), json.dumps(signals), json.dumps(extraction),
+             json.dumps(top_hashes), json.dumps(result)),
+        )
+        self.conn.commit()
+
+    def save_error(self, result: Dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, NULL, NULL, NULL, NULL, ?)",
+            (result["file_path"], json.dumps(result)),
+        )
+        self.conn.commit()
+
+    def manifest(self) -> Dict[str, Optional[Dict]]:
+        """file_path -> stored meta (size, mtime, hash); None for files that errored."""
+        return {
+            path: json.loads(meta) if meta else None
+            for path, meta in self.conn.execute("SELECT file_path, meta FROM files")
+        }
+
+    def update_meta(self, meta: Dict):
+        """Replace a stored file's meta (e.g. a new mtime for unchanged content), keeping its result."""
+        self.conn.execute("UPDATE files SET meta = ? WHERE file_path = ?", (json.dumps(meta), meta["file_path"]))
+        self.conn.commit()
+
+    def result(self, path: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT result FROM files WHERE file_path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def forget(self, paths: Iterable[str]):
+        self.conn.executemany("DELETE FROM files WHERE file_path = ?", [(p,) for p in paths])
+        self.conn.commit()
+
+    def files(self) -> Iterator[Dict]:
+        """Stored entries as dicts; meta/signals are None for files that errored."""
+        for path, meta, signals, extraction, top, result in self.conn.execute(
+                "SELECT file_path, meta, signals, extraction, top_rows, result FROM files ORDER BY file_path"):
+            yield {
+                "file_path": path,
+                "meta": json.loads(meta) if meta else None,
+                "signals": json.loads(signals) if signals else None,
+                "extraction": json.loads(extraction) if extraction else {},
+                "top_rows": json.loads(top) if top else [],
+                "result": json.loads(result),
+            }
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------- Instrumentation ----------
+
+class Metrics:
+    """
+    Run-wide per-stage times and counters, fed one match result at a time
+    (pass metrics= to the matching functions). Stages come from each
+    result's "timings" (open, text, fallback, ocr_render, ocr, docx,
+    extract, parse, score, topk); counters from its extraction stats.
+    Exported as JSON or in the Prometheus text format.
+    """
+
+    # Extraction stats summed into counters: stat -> counter name
+    PAGE_COUNTERS = {"pages_total": "pages", "pages_read": "pages_read",
+                     "fallback_pages": "fallback_pages", "ocr_pages": "ocr_pages"}
+
+    def __init__(self, prefix: str = "matcher"):
+        self.prefix = prefix
+        self.stages = {}   # stage -> {"count", "sum", "max"} in seconds
+        self.counters = Counter()
+        self.pipeline = None  # PipelineStats of the last pipelined run
+
+    def observe(self, stage: str, seconds: float):
+        s = self.stages.setdefault(stage, {"count": 0, "sum": 0.0, "max": 0.0})
+        s["count"] += 1
+        s["sum"] += seconds
+        s["max"] = max(s["max"], seconds)
+
+    def inc(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def record(self, result: Dict):
+        self.inc("files")
+        if "error" in result:
+            self.inc("errors")
+            return
+        extraction = result.get("extraction") or {}
+        timings = result.get("timings") or {}
+        for stat, name in self.PAGE_COUNTERS.items():
+            self.inc(name, extraction.get(stat, 0))
+        if extraction.get("stopped_early"):
+            self.inc("stopped_early")
+        if timings and "extract_s" not in timings:
+            self.inc("cache_hits")
+        for key, seconds in timings.items():
+            self.observe(key[:-2] if key.endswith("_s") else key, seconds)
+
+    def snapshot(self) -> Dict:
+        snap = {"counters": dict(self.counters), "stages": {k: dict(v) for k, v in self.stages.items()}}
+        if self.pipeline is not None:
+            snap["pipeline"] = self.pipeline.snapshot()
+        return snap
+
+    def prometheus(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent in each pipeline stage, per file.",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for stage, s in sorted(self.stages.items()):
+            lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {s["sum"]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        lines.append(f"# HELP {p}_stage_seconds_max Slowest single file in each stage.")
+        lines.append(f"# TYPE {p}_stage_seconds_max gauge")
+        for stage, s in sorted(self.stages.items()):
+            lines.append(f'{p}_stage_seconds_max{{stage="{stage}"}} {s["max"]:.6f}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        if self.pipeline is not None:
+            snap = self.pipeline.snapshot()
+            lines.append(f"# HELP {p}_stage_utilization Busy fraction of each pipeline stage's workers.")
+            lines.append(f"# TYPE {p}_stage_utilization gauge")
+            for stage, st in sorted(snap["stages"].items()):
+                lines.append(f'{p}_stage_utilization{{stage="{stage}"}} {st["utilization"]:.4f}')
+            lines.append(f"# TYPE {p}_queue_depth_max gauge")
+            for queue, q in sorted(snap["queues"].items()):
+                lines.append(f'{p}_queue_depth_max{{queue="{queue}"}} {q["max_depth"]}')
+            lines.append(f"# TYPE {p}_queue_depth_mean gauge")
+            for queue, q in sorted(snap["queues"].items()):
+                lines.append(f'{p}_queue_depth_mean{{queue="{queue}"}} {q["mean_depth"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def save_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh, indent=2)
+
+    def save_prometheus(self, path: str):
+        # Write then rename so a textfile collector never reads a partial file
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+class PipelineStats:
+    """
+    Queue depths and per-stage busy time for one pipelined run. A stage near
+    full utilization with a full queue in front of it is the bottleneck;
+    give it more workers, or the others fewer.
+    """
+
+    def __init__(self, workers: Dict[str, int], capacity: Dict[str, int]):
+        self.workers = workers     # stage -> parallel slots
+        self.capacity = capacity   # queue -> bound
+        self.busy = defaultdict(float)
+        self.items = Counter()
+        self.depth_sum = Counter()
+        self.depth_max = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def work(self, stage: str, seconds: float, n: int = 1):
+        self.busy[stage] += seconds
+        self.items[stage] += n
+
+    def sample(self, **depths: int):
+        self.samples += 1
+        for queue, depth in depths.items():
+            self.depth_sum[queue] += depth
+            self.depth_max[queue] = max(self.depth_max[queue], depth)
+
+    def snapshot(self) -> Dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        stages = {}
+        for stage, slots in self.workers.items():
+            stages[stage] = {
+                "workers": slots,
+                "items": self.items[stage],
+                "busy_s": self.busy[stage],
+                "utilization": self.busy[stage] / (slots * elapsed) if elapsed else 0.0,
+            }
+        queues = {}
+        for queue, bound in self.capacity.items():
+            queues[queue] = {
+                "capacity": bound,
+                "max_depth": self.depth_max[queue],
+                "mean_depth": self.depth_sum[queue] / self.samples if self.samples else 0.0,
+            }
+        return {"elapsed_s": elapsed, "stages": stages, "queues": queues}
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        stages = ", ".join(f"{k} {v['utilization']:.0%} of {v['workers']}" for k, v in snap["stages"].items())
+        queues = ", ".join(f"{k} {v['mean_depth']:.1f}/{v['capacity']}" for k, v in snap["queues"].items())
+        return f"pipeline: utilization {stages}; mean queue depth {queues}"
+
+
 # ---------- Matching ----------
 
 def guess_title_terms(text: str) -> str:
@@ -225,75 +1284,727 @@ def guess_title_terms(text: str) -> str:
     return header
 
 
-def match_files_to_assets(file_paths: List[str], assets_df: pd.DataFrame, compute_hash: bool = False) -> List[Dict]:
-    # Pre-normalize assets
-    assets = assets_df.to_dict(orient="records")
+def extract_and_parse(source, name: Optional[str] = None, **options) -> Tuple[str, Dict, Dict]:
+    """
+    Extract text from one file and parse its signals. Returns (text, signals,
+    extraction stats, with this run's stage times under "timings"). Kept at
+    module level so it can run in a worker process.
+    """
+    stats = {}
+    t0 = time.perf_counter()
+    text = extract_text_any(source, stats=stats, name=name, **options)
+    t1 = time.perf_counter()
+    signals = parse_identifiers(text)
+    signals["title_terms"] = guess_title_terms(text)
+    timings = stats.setdefault("timings", {})
+    timings["extract_s"] = t1 - t0  # all of extraction, including waiting on OCR
+    timings["parse_s"] = time.perf_counter() - t1
+    return text, signals, stats
+
+
+def split_document(document) -> Tuple[str, object]:
+    """
+    (name, source) for a document to match: a path, a named file-like object
+    such as an upload, or a (name, contents) pair.
+    """
+    if isinstance(document, tuple):
+        return document[0], document[1]
+    return source_name(document), document
 
-    results = []
-    for path in file_paths:
-        try:
-            text = extract_text_any(path)
-            signals = parse_identifiers(text)
-            signals["title_terms"] = guess_title_terms(text)
 
-            meta = {
-                "file_path": path,
-                "dir": os.path.dirname(path),
-                "name": os.path.basename(path),
-                "size": os.path.getsize(path),
-                "mtime": os.path.getmtime(path),
-                "hash": file_hash(path) if compute_hash else None,
-            }
+def file_meta(document, digest: Optional[str] = None) -> Dict:
+    path, source = split_document(document)
+    if is_path(source):
+        size, mtime = os.path.getsize(source), os.path.getmtime(source)
+    else:
+        size, mtime = memoryview(source_buffer(source)).nbytes, None
+    return {
+        "file_path": path,
+        "dir": os.path.dirname(path),
+        "name": os.path.basename(path),
+        "size": size,
+        "mtime": mtime,
+        "hash": digest,
+    }
 
-            scored = []
-            for a in assets:
-                sc, reasons = score_candidate(meta, a, signals)
-                scored.append({
-                    "asset_id": a.get("asset_id", None),
-                    "name": a.get("name", ""),
-                    "score": sc,
-                    "reasons": ", ".join(reasons) if reasons else "",
-                    "manufacturer": a.get("manufacturer", ""),
-                    "model": a.get("model", ""),
-                    "serial": a.get("serial", ""),
-                    "external_id": a.get("external_id", ""),
-                    "project": a.get("project", ""),
-                })
-
-            scored.sort(key=lambda x: x["score"], reverse=True)
-            top = scored[:5]
-
-            results.append({
-                "file_path": path,
-                "signals": signals,
-                "top_candidates": top,
-                "auto_choice": top[0] if top and top[0]["score"] >= 80 else None
-            })
+
+def analyze_file(document, compute_hash: bool = True, cache: Optional[ExtractionCache] = None,
+                 **options) -> Tuple[Dict, Dict, Dict]:
+    """
+    Extract and parse one document (see split_document), going through the
+    cache when one is given. Returns (meta, signals, extraction stats).
+    """
+    options = extract_options(**options)
+    name, source = split_document(document)
+    if not is_path(source):
+        # A file-like source can only be read once; meta, hash and extraction share the buffer
+        source = read_source(source)
+        document = (name, source)
+    digest = None
+    if compute_hash or cache is not None:
+        # One read feeds both the hash and the extractor
+        source = read_source(source, options["mmap_threshold"])
+        digest = file_hash(source, mmap_threshold=options["mmap_threshold"])
+
+    hit = cache.get(ExtractionCache.key(digest, **options)) if cache is not None else None
+    if hit is not None:
+        _, signals, stats = hit
+    else:
+        text, signals, stats = extract_and_parse(source, name=name, **options)
+        if cache is not None:
+            cache.put(ExtractionCache.key(digest, **options), text, signals, stats)
+
+    return file_meta(document, digest if compute_hash else None), signals, stats
+
+
+def build_result(meta: Dict, signals: Dict, extraction: Optional[Dict], top: List[Dict]) -> Dict:
+    return {
+        "file_path": meta["file_path"],
+        "signals": signals,
+        "extraction": extraction or {},
+        "top_candidates": top,
+        "auto_choice": top[0] if top and top[0]["score"] >= 80 else None
+    }
+
+
+def match_result(index: "AssetIndex", meta: Dict, signals: Dict, extraction: Optional[Dict] = None,
+                 top_k: int = 5, store: Optional[MatchStore] = None) -> Dict:
+    """
+    Rank one file's candidates and build its result. Stage times are moved
+    from the extraction stats to result["timings"], alongside score_s and
+    topk_s; files served from the cache only have those two.
+    """
+    extraction = dict(extraction or {})
+    timings = dict(extraction.pop("timings", {}))
+    t0 = time.perf_counter()
+    scores = index.score_vector(meta, signals)
+    t1 = time.perf_counter()
+    ranked = index.candidates(meta, signals, top_rows(scores, top_k))
+    timings["score_s"] = t1 - t0
+    timings["topk_s"] = time.perf_counter() - t1
+    result = build_result(meta, signals, extraction, [c for _, c in ranked])
+    result["timings"] = timings
+    if store is not None:
+        store.save(meta, signals, extraction, result, [index.table.row_hash(i) for i, _ in ranked])
+    return result
+
+
+def error_result(path: str, error: Exception) -> Dict:
+    return {
+        "file_path": path,
+        "error": str(error),
+        "top_candidates": []
+    }
+
+
+def _read_document(document, compute_hash: bool, need_digest: bool,
+                   mmap_threshold: Optional[int]) -> Tuple[Dict, Optional[str], object, float]:
+    """
+    Read stage for one document: stat it and, if a digest is needed, read it
+    once and hash the contents, which are then handed on for extraction
+    (large files stay paths, see read_source). Returns (meta, digest,
+    contents or None, seconds). Runs on an I/O thread.
+    """
+    t0 = time.perf_counter()
+    data = digest = None
+    name, source = split_document(document)
+    if not is_path(source):
+        # A file-like source can only be read once; meta, hash and extraction share the buffer
+        data = read_source(source)
+        document = (name, data)
+    if need_digest:
+        data = read_source(data if data is not None else source, mmap_threshold)
+        digest = file_hash(data, mmap_threshold=mmap_threshold)
+    meta = file_meta(document, digest if compute_hash else None)
+    return meta, digest, data, time.perf_counter() - t0
+
+
+def _pipelined_results(file_paths: Iterable[str], index: "AssetIndex", compute_hash: bool, workers: int,
+                       io_workers: int, cache: Optional[ExtractionCache], top_k: int, store: Optional[MatchStore],
+                       options: Dict, stats: PipelineStats) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield (position, result) in completion order from three overlapping stages:
+
+      read     io_workers threads stat files and read and hash them, so slow
+               (network) disk I/O runs alongside extraction and scoring
+      extract  workers processes (started by a forkserver, so scripts
+               need an `if __name__ == "__main__":` guard) extract and
+               parse; each OCRs its own pages on ocr_workers tesseract threads
+      score    this thread: cache lookups and writes, scoring and top-k
+
+    Each stage takes at most 2 * workers files ahead of the next, so a slow
+    stage holds back the ones before it and memory stays flat. Busy time
+    and queue depths go to stats. If an extraction worker dies (a crash or
+    the OOM killer), the files the pool had in flight get error results and
+    the pool is restarted for the rest.
+    """
+    need_digest = compute_hash or cache is not None
+    bound = 2 * workers
+    docs = enumerate(file_paths)
+    exhausted = False
+    reading = {}      # future -> (position, document)
+    waiting = []      # read, missed the cache, waiting for an extraction slot
+    extracting = {}   # future -> (position, document, meta, key, pool it runs on)
+    contents = {}     # position -> what the read stage read, for extraction
+
+    def score(i, document, meta, signals, extraction):
+        t0 = time.perf_counter()
+        try:
+            result = match_result(index, meta, signals, extraction, top_k, store)
         except Exception as e:
-            results.append({
-                "file_path": path,
-                "error": str(e),
-                "top_candidates": []
-            })
+            result = error_result(split_document(document)[0], e)
+        stats.work("score", time.perf_counter() - t0)
+        return i, result
+
+    # Workers come from a forkserver: forking this process while reader threads
+    # (and rapidfuzz's) are running could copy a held lock into the child
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
 
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+    pool = new_pool()
+    try:
+        with ThreadPoolExecutor(max_workers=io_workers) as readers:
+            while True:
+                while not exhausted and len(reading) + len(waiting) < bound:
+                    try:
+                        i, document = next(docs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    reading[readers.submit(_read_document, document, compute_hash, need_digest,
+                                           options["mmap_threshold"])] = (i, document)
+
+                for fut in [f for f in reading if f.done()]:
+                    i, document = reading.pop(fut)
+                    try:
+                        meta, digest, data, secs = fut.result()
+                        stats.work("read", secs)
+                        key = ExtractionCache.key(digest, **options) if cache is not None else None
+                        hit = cache.get(key) if cache is not None else None
+                    except Exception as e:
+                        yield i, error_result(split_document(document)[0], e)
+                        continue
+                    if hit is not None:
+                        yield score(i, document, meta, hit[1], hit[2])
+                    else:
+                        if data is not None:
+                            contents[i] = data
+                        waiting.append((i, document, meta, key))
+
+                broken = False
+                while waiting and len(extracting) < bound:
+                    i, document, meta, key = waiting[0]
+                    name, source = split_document(document)
+                    source = contents.get(i, source)
+                    if not is_path(source):
+                        source = bytes(source_buffer(source))  # views and uploads don't pickle
+                    try:
+                        fut = pool.submit(extract_and_parse, source, name, **options)
+                    except BrokenProcessPool:
+                        broken = True
+                        break
+                    waiting.pop(0)
+                    contents.pop(i, None)
+                    extracting[fut] = (i, document, meta, key, pool)
+
+                for fut in [f for f in extracting if f.done()]:
+                    i, document, meta, key, owner = extracting.pop(fut)
+                    try:
+                        text, signals, extraction = fut.result()
+                    except Exception as e:
+                        # A worker died (crash, OOM kill): every file it had in flight fails
+                        broken = broken or (isinstance(e, BrokenProcessPool) and owner is pool)
+                        yield i, error_result(split_document(document)[0], e)
+                        continue
+                    timings = extraction.get("timings", {})
+                    stats.work("extract", timings.get("extract_s", 0.0) + timings.get("parse_s", 0.0))
+                    if extraction.get("ocr_pages"):
+                        stats.work("ocr", timings.get("ocr_s", 0.0), n=extraction["ocr_pages"])
+                    if cache is not None:
+                        cache.put(key, text, signals, extraction)
+                    yield score(i, document, meta, signals, extraction)
+
+                if broken:
+                    print("[WARN] extraction worker died; restarting the pool")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = new_pool()
+                    continue
+
+                stats.sample(read=len(reading), extract_wait=len(waiting), extract=len(extracting))
+                if exhausted and not reading and not waiting and not extracting:
+                    break
+                wait(list(reading) + list(extracting), return_when=FIRST_COMPLETED)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    stats.finished = time.perf_counter()
+
+
+def iter_match_files_to_assets(file_paths: Iterable[str], assets_df: pd.DataFrame, compute_hash: bool = True,
+                               workers: int = 1, cache: Optional[ExtractionCache] = None,
+                               ordered: bool = True, top_k: int = 5, store: Optional[MatchStore] = None,
+                               metrics: Optional[Metrics] = None, io_workers: int = 4,
+                               **options) -> Iterator[Tuple[int, Dict]]:
+    """
+    Generator version of match_files_to_assets: yields (position, result) for
+    each file as soon as it is scored. With workers > 1, files go through a
+    pipeline (see _pipelined_results) with io_workers reader threads, and
+    with ordered=False results come out in completion order; position is
+    the file's index in file_paths. Each result keeps the top_k best
+    candidates. With a store, signals and results are recorded for
+    rematch_assets, and files it holds from an older register are first
+    rematched against this one; with metrics, each result is recorded there too, along
+    with the pipeline's utilization and queue depths. Extra keyword
+    arguments are extraction options (see DEFAULT_EXTRACT_OPTIONS).
+    """
+    # Pre-index assets once; an already built AssetIndex can be passed instead
+    index = assets_df if isinstance(assets_df, AssetIndex) else AssetIndex(assets_df)
+    options = extract_options(**options)
+    if store is not None and store.register() != index.table.row_hashes():
+        # Files already in the store were scored against the old register
+        rematch_assets(store, index, top_k=top_k)
+
+    for i, result in _ordered_results(file_paths, index, compute_hash, workers, cache, top_k, store,
+                                      ordered, options, io_workers, metrics):
+        if store is not None and "error" in result:
+            store.save_error(result)
+        if metrics is not None:
+            metrics.record(result)
+        yield i, result
+
+
+def _ordered_results(file_paths: Iterable[str], index: "AssetIndex", compute_hash: bool, workers: int,
+                     cache: Optional[ExtractionCache], top_k: int, store: Optional[MatchStore],
+                     ordered: bool, options: Dict, io_workers: int = 4,
+                     metrics: Optional[Metrics] = None) -> Iterator[Tuple[int, Dict]]:
+    if not workers or workers <= 1:
+        for i, document in enumerate(file_paths):
+            try:
+                meta, signals, stats = analyze_file(document, compute_hash, cache=cache, **options)
+                result = match_result(index, meta, signals, stats, top_k, store)
+            except Exception as e:
+                result = error_result(split_document(document)[0], e)
+            yield i, result
+        return
+
+    # Split the cores between file workers and their OCR pools
+    if options["ocr_workers"] is None:
+        options["ocr_workers"] = max(1, (os.cpu_count() or 1) // workers)
+    bound = 2 * workers
+    stats = PipelineStats(
+        workers={"read": io_workers, "extract": workers, "ocr": workers * options["ocr_workers"], "score": 1},
+        capacity={"read": bound, "extract_wait": bound, "extract": bound},
+    )
+    if metrics is not None:
+        metrics.pipeline = stats
+    pairs = _pipelined_results(file_paths, index, compute_hash, workers, io_workers, cache, top_k, store,
+                               options, stats)
+    if not ordered:
+        yield from pairs
+        return
+
+    # Hold early finishers back until every file before them is out
+    held = {}
+    next_i = 0
+    for i, result in pairs:
+        held[i] = result
+        while next_i in held:
+            yield next_i, held.pop(next_i)
+            next_i += 1
+
+
+def match_files_to_assets(file_paths: List[str], assets_df: pd.DataFrame, compute_hash: bool = True,
+                          workers: int = 1, cache: Optional[ExtractionCache] = None, top_k: int = 5,
+                          store: Optional[MatchStore] = None, metrics: Optional[Metrics] = None,
+                          io_workers: int = 4, **options) -> List[Dict]:
+    """
+    Match each file to its top asset candidates. With workers > 1, reading
+    (io_workers threads), extraction (a process pool) and scoring overlap in
+    a pipeline; the returned list keeps the order of file_paths either way.
+    With compute_hash (the default) or a cache, each file is read once and
+    the same bytes are hashed and extracted. Files already in the extraction
+    cache skip extraction and parsing. Entries of file_paths may also be in-memory
+    documents, (name, contents) pairs or named uploads, which are extracted
+    and hashed without touching disk; their file_path is the name. Extra
+    keyword arguments are extraction options (see DEFAULT_EXTRACT_OPTIONS),
+    e.g. max_pages=40 or stable_pages=3.
+    """
+    return [r for _, r in iter_match_files_to_assets(
+        file_paths, assets_df, compute_hash=compute_hash, workers=workers, cache=cache, top_k=top_k,
+        store=store, metrics=metrics, io_workers=io_workers, **options
+    )]
+
+
+def rematch_assets(store: MatchStore, assets_df: pd.DataFrame, top_k: int = 5) -> List[Dict]:
+    """
+    Re-match every file in the store against a new register revision using
+    the stored signals, without touching the documents.
+
+    Rows are diffed against the store's register by content hash. Added or
+    edited rows are scored on their own and merged into each file's stored
+    top_k. A file is rescored against the whole register instead when one of
+    its stored candidates was edited or removed, its stored list may not be
+    the true top_k (fewer entries, or zero-score padding), or unchanged rows
+    moved relative to each other. Returns the updated results, ordered by
+    file path, and records them in the store.
+    """
+    index = assets_df if isinstance(assets_df, AssetIndex) else AssetIndex(assets_df)
+    table = index.table
+    hashes = table.row_hashes()
+    positions = {}
+    for i, h in enumerate(hashes):
+        positions.setdefault(h, i)
+    # Multiset diff: the n-th copy of a row hash is new if there were fewer
+    # than n copies before. Unchanged rows must keep their old relative order,
+    # otherwise ties could break differently and everything is rescored.
+    old_positions = {}
+    counts = Counter()
+    for pos, h in enumerate(store.register()):
+        counts[h] += 1
+        old_positions[h, counts[h]] = pos
+    seen = Counter()
+    changed = []
+    reordered = False
+    last = -1
+    for i, h in enumerate(hashes):
+        seen[h] += 1
+        pos = old_positions.get((h, seen[h]))
+        if pos is None:
+            changed.append(i)
+        else:
+            reordered = reordered or pos < last
+            last = pos
+    shrunk = {h for h, c in counts.items() if seen[h] < c}
+    delta = AssetIndex(table.subset(changed), fuzzy_workers=index.fuzzy_workers) if changed else None
+
+    entries = list(store.files())
+    results = [None] * len(entries)
+    merge, rescore = [], []
+    for n, e in enumerate(entries):
+        if e["meta"] is None:
+            results[n] = e["result"]  # extraction failed; nothing to rescore
+            continue
+        top, cands = e["top_rows"], e["result"]["top_candidates"]
+        if reordered or len(top) < top_k or len(set(top)) < len(top) or any(h in shrunk for h in top[:top_k]) \
+                or any(c["score"] <= 0 for c in cands[:top_k]):
+            rescore.append(n)
+        else:
+            merge.append(n)
+
+    if merge and delta is not None:
+        vectors = delta.score_vectors([entries[n]["meta"] for n in merge], [entries[n]["signals"] for n in merge])
+    else:
+        vectors = [None] * len(merge)
+    for n, scores in zip(merge, vectors):
+        e = entries[n]
+        pool = [(c["score"], positions[h]) for h, c in zip(e["top_rows"][:top_k], e["result"]["top_candidates"])]
+        if scores is not None:
+            pool += [(int(scores[j]), changed[j]) for j in np.flatnonzero(scores)]
+        pool.sort(key=lambda x: (-x[0], x[1]))
+        ranked = index.candidates(e["meta"], e["signals"], [i for _, i in pool[:top_k]])
+        results[n] = _store_ranked(store, index, e, ranked)
+
+    if rescore:
+        ranked_all = index.rank_batch([entries[n]["meta"] for n in rescore],
+                                      [entries[n]["signals"] for n in rescore], k=top_k)
+        for n, ranked in zip(rescore, ranked_all):
+            results[n] = _store_ranked(store, index, entries[n], ranked)
+
+    store.save_register(hashes)
     return results
 
 
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")
+
+
+def scan_documents(root: str, extensions: Tuple[str, ...] = DOCUMENT_EXTENSIONS) -> List[str]:
+    """Every file under root with one of the given extensions, sorted."""
+    found = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in extensions:
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def match_directory(root: str, assets_df: pd.DataFrame, store: MatchStore, compute_hash: bool = True,
+                    workers: int = 1, cache: Optional[ExtractionCache] = None, top_k: int = 5,
+                    metrics: Optional[Metrics] = None, **options) -> List[Dict]:
+    """
+    Match every document under root, reusing the store for files seen
+    before. A file is only extracted and scored again if its size or mtime
+    differ from the stored meta (with compute_hash, a file whose content
+    hash is unchanged is still reused and its new mtime stored), or if it
+    failed last time. Stored results are first brought up to date with the
+    register via rematch_assets, and files that no longer exist are dropped
+    from the store. Returns results in sorted path order.
+    """
+    index = assets_df if isinstance(assets_df, AssetIndex) else AssetIndex(assets_df)
+    paths = scan_documents(root)
+    manifest = store.manifest()
+
+    present = set(paths)
+    store.forget(p for p in manifest if p not in present)
+    if store.register() != index.table.row_hashes():
+        rematch_assets(store, index, top_k=top_k)
+
+    todo = []
+    for path in paths:
+        old = manifest.get(path)
+        if old is not None:
+            try:
+                st = os.stat(path)
+                if old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+                    continue
+                if compute_hash and old.get("hash") and old["size"] == st.st_size \
+                        and old["hash"] == file_hash(path):
+                    # Only touched: remember the new mtime so the next run skips the hash too
+                    store.update_meta(dict(old, mtime=st.st_mtime))
+                    continue
+            except OSError:
+                pass
+        todo.append(path)
+
+    fresh = {}
+    if not todo:
+        return [store.result(p) for p in paths]
+    for i, result in iter_match_files_to_assets(todo, index, compute_hash=compute_hash, workers=workers,
+                                                cache=cache, top_k=top_k, store=store, ordered=False,
+                                                metrics=metrics, **options):
+        fresh[todo[i]] = result
+    return [fresh[p] if p in fresh else store.result(p) for p in paths]
+
+
+def _store_ranked(store: MatchStore, index: "AssetIndex", entry: Dict, ranked: List[Tuple[int, Dict]]) -> Dict:
+    result = build_result(entry["meta"], entry["signals"], entry["extraction"], [c for _, c in ranked])
+    store.save(entry["meta"], entry["signals"], entry["extraction"], result,
+               [index.table.row_hash(i) for i, _ in ranked])
+    return result
+
+
 # ---------- Utility ----------
 
-def save_results_csv(matches: List[Dict], save_path: str):
-    rows = []
-    for r in matches:
-        for c in r.get("top_candidates", []):
-            rows.append({
-                "file_path": r["file_path"],
-                "asset_id": c["asset_id"],
-                "asset_name": c["name"],
-                "score": c["score"],
-                "reasons": c["reasons"],
-                "manufacturer": c["manufacturer"],
-                "model": c["model"],
-                "serial": c["serial"],
-                "external_id": c["external_id"],
-                "project": c["project"],
-            })
+RESULT_COLUMNS = [
+    "file_path", "asset_id", "asset_name", "score", "reasons",
+    "manufacturer", "model", "serial", "external_id", "project",
+]
+
+# Extracted signals repeated on every candidate row of a file
+SIGNAL_COLUMNS = ["signal_asset_ids", "signal_serials", "signal_models", "signal_manufacturers", "title_terms"]
+
+
+def result_rows(result: Dict, join_lists: bool = True) -> Iterator[Dict]:
+    """
+    One flat row per candidate of a match result, with the file's extracted
+    signals alongside. List signals are "; "-joined unless join_lists is False.
+    """
+    signals = result.get("signals") or {}
+    extra = {}
+    for col, key in zip(SIGNAL_COLUMNS, ("asset_ids", "serials", "models", "manufacturers")):
+        values = list(signals.get(key, []))
+        extra[col] = "; ".join(values) if join_lists else values
+    extra["title_terms"] = signals.get("title_terms", "")
+
+    for c in result.get("top_candidates", []):
+        yield {
+            "file_path": result["file_path"],
+            "asset_id": c["asset_id"],
+            "asset_name": c["name"],
+            "score": c["score"],
+            "reasons": c["reasons"],
+            "manufacturer": c["manufacturer"],
+            "model": c["model"],
+            "serial": c["serial"],
+            "external_id": c["external_id"],
+            "project": c["project"],
+            **extra,
+        }
+
+
+def save_results_csv(matches: Iterable[Dict], save_path: str) -> int:
+    """
+    Write candidate rows to CSV as results arrive; matches can be a
+    generator (e.g. from iter_match_files_to_assets), so memory stays flat.
+    Returns the number of rows written.
+    """
+    n = 0
+    with open(save_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS + SIGNAL_COLUMNS)
+        writer.writeheader()
+        for r in matches:
+            for row in result_rows(r):
+                writer.writerow(row)
+                n += 1
+    return n
+
+
+def save_results_jsonl(matches: Iterable[Dict], save_path: str) -> int:
+    """As save_results_csv, one JSON object per line; signals stay lists."""
+    n = 0
+    with open(save_path, "w", encoding="utf-8") as f:
+        for r in matches:
+            for row in result_rows(r, join_lists=False):
+                f.write(json.dumps(row, ensure_ascii=False))
+                f.write("\n")
+                n += 1
+    return n
+
+
+def save_results_parquet(matches: Iterable[Dict], save_path: str, batch_rows: int = 10000) -> int:
+    """
+    As save_results_csv, written as Parquet row groups of batch_rows rows;
+    signals are list<string> columns. Needs pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)") from e
+
+    list_type = pa.list_(pa.string())
+    schema = pa.schema(
+        [(c, pa.int64() if c == "score" else pa.string()) for c in RESULT_COLUMNS]
+        + [(c, pa.string() if c == "title_terms" else list_type) for c in SIGNAL_COLUMNS]
+    )
+
+    n = 0
+    batch = []
+    with pq.ParquetWriter(save_path, schema) as writer:
+        for r in matches:
+            for row in result_rows(r, join_lists=False):
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    n += len(batch)
+                    batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            n += len(batch)
+    return n
+
+
+def save_results(matches: Iterable[Dict], save_path: str) -> int:
+    """Stream results to CSV, Parquet or JSONL, chosen by the file extension."""
+    ext = os.path.splitext(save_path)[1].lower()
+    if ext == ".parquet":
+        return save_results_parquet(matches, save_path)
+    if ext in (".jsonl", ".ndjson"):
+        return save_results_jsonl(matches, save_path)
+    return save_results_csv(matches, save_path)
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """Directories are scanned for documents, globs expanded, plain files kept."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(scan_documents(item))
+        elif any(ch in item for ch in "*?["):
+            paths.extend(sorted(
+                p for p in glob.glob(item, recursive=True)
+                if os.path.splitext(p)[1].lower() in DOCUMENT_EXTENSIONS
+            ))
+        else:
+            paths.append(item)
+    return list(dict.fromkeys(paths))
+
+
+class Progress:
+    """Throttled progress and throughput lines on stderr."""
+
+    def __init__(self, total: int, n_assets: int, every: float = 1.0):
+        self.total = total
+        self.n_assets = n_assets
+        self.every = every
+        self.done = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def update(self, result: Dict):
+        self.done += 1
+        if "error" in result:
+            self.errors += 1
+        now = time.perf_counter()
+        if now - self.last >= self.every or self.done == self.total:
+            self.last = now
+            self.report(now)
+
+    def report(self, now: Optional[float] = None):
+        elapsed = max((now or time.perf_counter()) - self.start, 1e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        print(
+            f"[{self.done}/{self.total}] {rate:.2f} files/s, {rate * self.n_assets:,.0f} asset-file pairs/s, "
+            f"{self.errors} errors, elapsed {elapsed:.0f}s, eta {eta:.0f}s",
+            file=sys.stderr, flush=True,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="python -m matcher",
+        description="Match O&M documents (PDF/DOCX) to an asset register without the UI.",
+    )
+    ap.add_argument("assets", help="asset register (.csv or .xlsx)")
+    ap.add_argument("inputs", nargs="+", help="documents, directories or glob patterns")
+    ap.add_argument("-o", "--output", required=True, help="results file: .csv, .parquet or .jsonl")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    ap.add_argument("--io-workers", type=int, default=4, help="threads reading and hashing files")
+    ap.add_argument("--cache-dir", help="directory for the extraction cache")
+    ap.add_argument("--cache-max-mb", type=int, default=2048)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--no-hash", action="store_true",
+                    help="skip file hashes (no hash matching; PDFs are read lazily instead of in one read)")
+    ap.add_argument("--no-ocr", action="store_true", help="never OCR pages without a text layer")
+    ap.add_argument("--max-pages-ocr", type=int, default=DEFAULT_EXTRACT_OPTIONS["max_pages_ocr"])
+    ap.add_argument("--max-pages", type=int, help="read at most this many pages per PDF")
+    ap.add_argument("--stable-pages", type=int, default=0,
+                    help="stop reading a PDF after this many pages add no new signal")
+    ap.add_argument("--mmap-threshold-mb", type=int,
+                    default=DEFAULT_EXTRACT_OPTIONS["mmap_threshold"] // (1024 * 1024),
+                    help="memory-map files at least this big instead of reading them into memory")
+    ap.add_argument("--metrics-json", help="write stage timings and counters to this JSON file")
+    ap.add_argument("--metrics-prom", help="write stage timings and counters in Prometheus text format")
+    args = ap.parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    index = AssetIndex(AssetTable.from_file(args.assets))
+    print(f"{len(index)} assets, {len(paths)} documents", file=sys.stderr)
+
+    cache = None
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        cache = ExtractionCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    progress = Progress(len(paths), len(index))
+    metrics = Metrics()
+
+    def results():
+        for _, result in iter_match_files_to_assets(
+                paths, index, compute_hash=not args.no_hash, workers=args.workers, cache=cache, top_k=args.top_k,
+                use_ocr_if_empty=not args.no_ocr, max_pages_ocr=args.max_pages_ocr,
+                max_pages=args.max_pages, stable_pages=args.stable_pages, metrics=metrics,
+                mmap_threshold=args.mmap_threshold_mb * 1024 * 1024,
+                io_workers=args.io_workers):
+            progress.update(result)
+            yield result
+
+    rows = save_results(results(), args.output)
+    if cache is not None:
+        print(f"cache: {cache.stats()}", file=sys.stderr)
+        cache.close()
+    print(f"wrote {rows} rows to {args.output}", file=sys.stderr)
+    if metrics.pipeline is not None:
+        print(metrics.pipeline.summary(), file=sys.stderr)
+    if args.metrics_json:
+        metrics.save_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.save_prometheus(args.metrics_prom)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
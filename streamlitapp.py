@@ -1,14 +1,119 @@
 import os
-import tempfile
+import hashlib
+import io
 import time
 import pandas as pd
 import streamlit as st
 
-from matcher import match_files_to_assets, save_results_csv
+from matcher import AssetIndex, AssetTable, iter_match_files_to_assets, save_results_csv
 
 st.set_page_config(page_title="O&M Matcher", layout="wide")
 st.title("O&M Matcher — Link O&M Manuals to Assets")
 
+
+# --- Caching: every widget interaction reruns this script, so the register
+# and each file's match are cached by content digest and only recomputed when
+# the uploads or options actually change.
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_digest(f) -> str:
+    """sha256 of an upload, computed once per upload (file_id) rather than on every rerun."""
+    digests = st.session_state.setdefault("upload_digests", {})
+    if f.file_id not in digests:
+        digests[f.file_id] = digest(f.getbuffer())
+    return digests[f.file_id]
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_assets(assets_digest: str, _data: bytes, name: str) -> AssetIndex:
+    return AssetIndex(AssetTable.from_file(io.BytesIO(_data), name=name))
+
+
+def stream_results(uploads: list, keys: list, index: AssetIndex, compute_hash: bool):
+    """
+    Yield (result, cached) for each upload in order as soon as it is matched.
+    Results are kept in session_state by (register, options, upload digest),
+    so reruns replay them instantly and a run interrupted by a widget change
+    resumes where it stopped.
+    """
+    cache = st.session_state.setdefault("match_results", {})
+    # The same file uploaded twice is matched once; the copy replays the result
+    first = {}
+    for i, key in enumerate(keys):
+        first.setdefault(key, i)
+    todo = [i for key, i in first.items() if key not in cache]
+    fresh = iter_match_files_to_assets([uploads[i] for i in todo], index, compute_hash=compute_hash)
+    for key in keys:
+        if key in cache:
+            yield cache[key], True
+        else:
+            cache[key] = next(fresh)[1]
+            yield cache[key], False
+
+    # Forget files that are no longer uploaded
+    for key in set(cache) - set(keys):
+        del cache[key]
+
+
+def stage_summary(totals: dict) -> str:
+    stages = [("extract", "extract_s"), ("OCR", "ocr_s"), ("parse", "parse_s"), ("score", "score_s")]
+    return ", ".join(f"{label} {totals.get(k, 0.0):.1f}s" for label, k in stages)
+
+
+def render_result(i: int, r: dict, auto_confirm_threshold: int):
+    """One file's card: extracted identifiers, candidates and the confirm form."""
+    st.subheader(os.path.basename(r["file_path"]))
+    col_left, col_right = st.columns([2, 1])
+
+    with col_left:
+        if "signals" in r:
+            st.markdown("**Extracted identifiers**")
+            st.write({
+                "asset_ids": r["signals"].get("asset_ids", []),
+                "serials": r["signals"].get("serials", []),
+                "models": r["signals"].get("models", []),
+                "manufacturers": r["signals"].get("manufacturers", []),
+            })
+        if r.get("error"):
+            st.error(r["error"])
+
+        candidates_df = pd.DataFrame(r.get("top_candidates", []))
+        if not candidates_df.empty:
+            st.dataframe(candidates_df)
+
+    with col_right:
+        options = ["None"] + [f"{c['asset_id']} — {c['name']} (score {c['score']})" for c in r.get("top_candidates", [])]
+        default_index = 0
+        if r.get("auto_choice"):
+            # Pick the one with score ≥ threshold
+            top = r["auto_choice"]
+            if top["score"] >= auto_confirm_threshold:
+                # Find its index in options
+                for idx, o in enumerate(options):
+                    if o.startswith(str(top["asset_id"]) + " —"):
+                        default_index = idx
+                        break
+
+        choice = st.selectbox("Confirm match:", options, index=default_index, key=f"{i}:{r['file_path']}")
+        note = st.text_input("Notes (optional)", key=f"{i}:{r['file_path']}_note")
+
+        if st.button("Save", key=f"{i}:{r['file_path']}_save"):
+            chosen_asset_id = None
+            if choice != "None":
+                chosen_asset_id = choice.split(" — ")[0]
+            st.session_state.confirmed.append({
+                "file_path": r["file_path"],
+                "chosen_asset_id": chosen_asset_id,
+                "note": note,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "auto_chosen": bool(r.get("auto_choice") and choice != "None")
+            })
+            st.success("Saved!")
+
+
 st.markdown("""
 Upload your **assets list** (CSV/Excel) and your **O&M files** (PDF/DOCX).  
 The app extracts identifiers and proposes top matches with a confidence score.
@@ -17,7 +122,7 @@ The app extracts identifiers and proposes top matches with a confidence score.
 # --- Sidebar options ---
 with st.sidebar:
     st.header("Options")
-    compute_hash = st.checkbox("Compute file hashes (slower, more accurate)", value=False)
+    compute_hash = st.checkbox("Compute file hashes (enables hash matching)", value=True)
     auto_confirm_threshold = st.slider("Auto-confirm threshold", 60, 100, 80)
     st.caption("Candidates scoring ≥ threshold will be auto-selected.")
 
@@ -25,10 +130,9 @@ with st.sidebar:
 assets_file = st.file_uploader("Upload assets list (CSV/Excel)", type=["csv", "xlsx"])
 assets_df = None
 if assets_file is not None:
-    if assets_file.name.lower().endswith(".csv"):
-        assets_df = pd.read_csv(assets_file)
-    else:
-        assets_df = pd.read_excel(assets_file)
+    assets_digest = upload_digest(assets_file)
+    assets_index = load_assets(assets_digest, assets_file.getvalue(), assets_file.name)
+    assets_df = assets_index.table
     st.success(f"Loaded {len(assets_df)} assets.")
     st.dataframe(assets_df.head())
 
@@ -36,70 +140,44 @@ if assets_file is not None:
 om_files = st.file_uploader("Upload O&M files (PDF/DOCX)", type=["pdf", "docx"], accept_multiple_files=True)
 
 if assets_df is not None and om_files:
-    # Save uploads to temp files so extractors can read them
-    temp_paths = []
-    for f in om_files:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(f.name)[1])
-        tmp.write(f.read())
-        tmp.flush(); tmp.close()
-        temp_paths.append(tmp.name)
+    uploads = [(f.name, f.getbuffer()) for f in om_files]
+    upload_key = tuple((f.name, upload_digest(f)) for f in om_files)
 
-    with st.spinner("Matching O&M files to assets..."):
-        results = match_files_to_assets(temp_paths, assets_df, compute_hash=compute_hash)
+    # Forget digests of uploads that have been removed
+    live = {f.file_id for f in om_files} | {assets_file.file_id}
+    for file_id in set(st.session_state.upload_digests) - live:
+        del st.session_state.upload_digests[file_id]
 
     # Store confirmations
     if "confirmed" not in st.session_state:
         st.session_state.confirmed = []
 
-    # Display each file’s candidates
-    for r in results:
-        st.subheader(os.path.basename(r["file_path"]))
-        col_left, col_right = st.columns([2, 1])
-
-        with col_left:
-            if "signals" in r:
-                st.markdown("**Extracted identifiers**")
-                st.write({
-                    "asset_ids": r["signals"].get("asset_ids", []),
-                    "serials": r["signals"].get("serials", []),
-                    "models": r["signals"].get("models", []),
-                    "manufacturers": r["signals"].get("manufacturers", []),
-                })
-            if r.get("error"):
-                st.error(r["error"])
-
-            candidates_df = pd.DataFrame(r.get("top_candidates", []))
-            if not candidates_df.empty:
-                st.dataframe(candidates_df)
-
-        with col_right:
-            options = ["None"] + [f"{c['asset_id']} — {c['name']} (score {c['score']})" for c in r.get("top_candidates", [])]
-            default_index = 0
-            if r.get("auto_choice"):
-                # Pick the one with score ≥ threshold
-                top = r["auto_choice"]
-                if top["score"] >= auto_confirm_threshold:
-                    # Find its index in options
-                    for idx, o in enumerate(options):
-                        if o.startswith(str(top["asset_id"]) + " —"):
-                            default_index = idx
-                            break
-
-            choice = st.selectbox("Confirm match:", options, index=default_index, key=r["file_path"])
-            note = st.text_input("Notes (optional)", key=r["file_path"] + "_note")
-
-            if st.button("Save", key=r["file_path"] + "_save"):
-                chosen_asset_id = None
-                if choice != "None":
-                    chosen_asset_id = choice.split(" — ")[0]
-                st.session_state.confirmed.append({
-                    "file_path": r["file_path"],
-                    "chosen_asset_id": chosen_asset_id,
-                    "note": note,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "auto_chosen": bool(r.get("auto_choice") and choice != "None")
-                })
-                st.success("Saved!")
+    # Display each file's candidates as soon as it is matched
+    keys = [(assets_digest, compute_hash, name, sha) for name, sha in upload_key]
+    progress = st.progress(0.0, text="Matching O&M files to assets...")
+    totals = {}
+    t0 = time.perf_counter()
+    matched = 0
+    for i, (r, cached) in enumerate(stream_results(uploads, keys, assets_index, compute_hash)):
+        render_result(i, r, auto_confirm_threshold)
+        if cached:
+            continue
+        matched += 1
+        for stage, secs in r.get("timings", {}).items():
+            totals[stage] = totals.get(stage, 0.0) + secs
+        elapsed = time.perf_counter() - t0
+        rate = matched / elapsed if elapsed else 0.0
+        remaining = sum(1 for key in keys[i + 1:] if key not in st.session_state.match_results)
+        eta = remaining / rate if rate else 0.0
+        progress.progress((i + 1) / len(keys), text=(
+            f"{i + 1}/{len(keys)} files · {rate:.2f} files/s · ETA {eta:.0f}s · {stage_summary(totals)}"
+        ))
+    if matched:
+        progress.progress(1.0, text=(
+            f"Matched {matched} files in {time.perf_counter() - t0:.1f}s · {stage_summary(totals)}"
+        ))
+    else:
+        progress.empty()
 
     # Export section
     st.divider()
@@ -108,9 +186,7 @@ if assets_df is not None and om_files:
         export_df = pd.DataFrame(st.session_state.confirmed)
         st.dataframe(export_df)
         if st.button("Download CSV of confirmations"):
-            out = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
-            export_df.to_csv(out.name, index=False)
-            st.download_button("Download", data=open(out.name, "rb").read(), file_name="om_matches.csv")
+            st.download_button("Download", data=export_df.to_csv(index=False).encode("utf-8"), file_name="om_matches.csv")
     else:
         st.info("No confirmations yet.")
 
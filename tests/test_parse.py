@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+from benchmarks import legacy_parse_identifiers, synthetic_manual_text
+from matcher import parse_identifiers
+
+# Fragments chosen to hit every pattern, their overlaps and their edges
+FRAGMENTS = [
+    "S/N", "SN", "sn:", "Serial", "Serial No.", "Serial Number", "SERIAL NO", "serial no.", "#", ":", "-", " - ",
+    "Model", "model no.", "Model Number", "Type", "type", "MODEL:", "Manufacturer", "manufacturer:", "Made by",
+    "made by:", "TAG", "TAG-", "tag 1234", "AHU-12", "AHU-123", "CHW-105", "chw105", "ABCDEF-1234", "BLR1002",
+    "X1234567", "SN12345", "AB", "CR-10", "CR10.5_A", "VLT6000-2", "Acme Pumps", "Grundfos, Ltd.", "A&B Co",
+    "Trane", "12345", "0000000000000000000001", "é", " ", "  ", "\n", "\t", ",", ".", "/", "(", ")",
+]
+
+
+def fuzz_text(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(FRAGMENTS) + rng.choice(["", " ", " ", "\n", ":", "-"]) for _ in range(n))
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_parse_identifiers_matches_per_pattern_scan(seed):
+    text = fuzz_text(random.Random(seed), 60)
+    assert parse_identifiers(text) == legacy_parse_identifiers(text)
+
+
+def test_parse_identifiers_on_manual_text():
+    text = synthetic_manual_text(256 * 1024, seed=3)
+    assert parse_identifiers(text) == legacy_parse_identifiers(text)
+
+
+@pytest.mark.parametrize("text", ["", "no identifiers here", "S/N", "Model", "Manufacturer:"])
+def test_parse_identifiers_edge_cases(text):
+    assert parse_identifiers(text) == legacy_parse_identifiers(text)
@@ -0,0 +1,27 @@
+import os
+
+import matcher
+from test_rematch import register, write_pdf
+
+
+def crashing_extract(source, name=None, **options):
+    """extract_and_parse, except that a worker handed crash.pdf dies on the spot."""
+    if os.path.basename(name or "") == "crash.pdf":
+        os._exit(1)
+    return matcher.extract_and_parse(source, name, **options)
+
+
+def test_dead_worker_costs_one_error(tmp_path, monkeypatch):
+    paths = []
+    for n in range(12):
+        path = tmp_path / ("crash.pdf" if n == 2 else f"doc{n}.pdf")
+        write_pdf(path, f"CHW-{100 + n}", "Acme Pumps", "CR-10", f"SN{12345 + n}")
+        paths.append(str(path))
+    monkeypatch.setattr(matcher, "extract_and_parse", crashing_extract)
+
+    results = matcher.match_files_to_assets(paths, register(), workers=2)
+    assert [r["file_path"] for r in results] == paths
+    assert "error" in results[2]
+    # Files in flight alongside the crash (at most 2 * workers) may fail with it
+    assert "error" not in results[-1]
+    assert results[-1]["top_candidates"][0]["asset_id"] == "CHW-111"
@@ -0,0 +1,165 @@
+import os
+
+import fitz
+import pandas as pd
+import pytest
+
+import matcher
+
+MAKERS = ["Acme Pumps", "Grundfos", "Daikin", "Trane", "Carrier"]
+
+
+def register(n=30):
+    rows = []
+    for i in range(n):
+        rows.append({
+            "asset_id": f"CHW-{100 + i}",
+            "name": f"Chilled water pump CHW-{100 + i}" if i % 3 else f"Air handling unit AHU-{i}",
+            "manufacturer": MAKERS[i % len(MAKERS)],
+            "model": f"CR-{10 + i % 4}",
+            "serial": f"SN{12345 + i}",
+        })
+    return pd.DataFrame(rows)
+
+
+def write_pdf(path, asset_id, maker, model, serial):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 72), f"Operations and Maintenance Manual\nAsset Tag: {asset_id}\n"
+                               f"Manufacturer: {maker}\nModel: {model}\nS/N: {serial}\n")
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    specs = [
+        ("CHW-101", "Grundfos", "CR-11", "SN12346"),
+        ("CHW-104", "Carrier", "CR-10", "SN12349"),
+        ("CHW-107", "Daikin", "CR-13", "SN99999"),
+        ("", "Acme Pumps", "CR-12", ""),
+        ("CHW-140", "Trane", "CR-10", "SN12360"),
+        ("", "", "", ""),
+    ]
+    for n, spec in enumerate(specs):
+        write_pdf(root / f"doc{n}.pdf", *spec)
+    return root
+
+
+def revisions(df):
+    """Register revisions: edited, added, removed and reordered rows."""
+    edited = df.copy()
+    edited.loc[1, "serial"] = "SN00000"
+    edited.loc[7, "manufacturer"] = "Trane"
+    edited.loc[20, "model"] = "CR-13"
+
+    extra = pd.DataFrame([
+        {"asset_id": "CHW-140", "name": "Chilled water pump CHW-140", "manufacturer": "Trane",
+         "model": "CR-10", "serial": "SN12360"},
+        {"asset_id": "AHU-9", "name": "Air handling unit AHU-9", "manufacturer": "Acme Pumps",
+         "model": "CR-12", "serial": "SN55555"},
+    ])
+    added = pd.concat([df, extra]).reset_index(drop=True)
+    removed = df.drop([1, 4, 12]).reset_index(drop=True)
+    reordered = df.iloc[::-1].reset_index(drop=True)
+    mixed = pd.concat([edited.drop([3, 4]), extra]).reset_index(drop=True)
+    return {"edited": edited, "added": added, "removed": removed, "reordered": reordered, "mixed": mixed}
+
+
+def candidates(results):
+    return {r["file_path"]: r.get("top_candidates") for r in results}
+
+
+@pytest.mark.parametrize("revision", ["edited", "added", "removed", "reordered", "mixed"])
+def test_rematch_equals_full_run(tmp_path, docs, revision):
+    df = register()
+    new = revisions(df)[revision]
+    paths = sorted(str(p) for p in docs.glob("*.pdf"))
+    store = matcher.MatchStore(str(tmp_path / "store.sqlite"))
+    matcher.match_files_to_assets(paths, df, store=store)
+
+    got = matcher.rematch_assets(store, new)
+    assert candidates(got) == candidates(matcher.match_files_to_assets(paths, new))
+    assert store.register() == matcher.AssetIndex(new).table.row_hashes()
+
+
+def test_match_directory_equals_full_run(tmp_path, docs, monkeypatch):
+    df = register()
+    store = matcher.MatchStore(str(tmp_path / "store.sqlite"))
+    analyzed = []
+    analyze_file = matcher.analyze_file
+
+    def counting(document, *args, **kwargs):
+        analyzed.append(document)
+        return analyze_file(document, *args, **kwargs)
+
+    monkeypatch.setattr(matcher, "analyze_file", counting)
+
+    def full(assets):
+        return candidates(matcher.match_files_to_assets(matcher.scan_documents(str(docs)), assets))
+
+    got = matcher.match_directory(str(docs), df, store)
+    assert candidates(got) == full(df)
+
+    # Nothing changed: everything comes from the store
+    analyzed.clear()
+    got = matcher.match_directory(str(docs), df, store)
+    assert analyzed == []
+    assert candidates(got) == full(df)
+
+    # New register revision: stored signals are rescored, documents are not read
+    new = revisions(df)["mixed"]
+    analyzed.clear()
+    got = matcher.match_directory(str(docs), new, store)
+    assert analyzed == []
+    assert candidates(got) == full(new)
+
+    # A new file, a removed file and an edited file
+    write_pdf(docs / "new.pdf", "CHW-110", "Acme Pumps", "CR-10", "SN12355")
+    os.remove(docs / "doc5.pdf")
+    write_pdf(docs / "doc0.pdf", "CHW-103", "Trane", "CR-13", "SN12348")
+    os.utime(docs / "doc0.pdf", (1, 1))
+    analyzed.clear()
+    got = matcher.match_directory(str(docs), new, store)
+    assert sorted(analyzed) == sorted([str(docs / "doc0.pdf"), str(docs / "new.pdf")])
+    assert candidates(got) == full(new)
+    assert sorted(store.manifest()) == matcher.scan_documents(str(docs))
+
+
+def test_partial_run_keeps_other_stored_files_current(tmp_path, docs):
+    df = register()
+    new = revisions(df)["mixed"]
+    paths = sorted(str(p) for p in docs.glob("*.pdf"))
+    store = matcher.MatchStore(str(tmp_path / "store.sqlite"))
+    matcher.match_files_to_assets(paths, df, store=store)
+
+    # Matching one file against a new register must not leave the rest stale
+    matcher.match_files_to_assets(paths[:1], new, store=store)
+    got = matcher.match_directory(str(docs), new, store)
+    assert candidates(got) == candidates(matcher.match_files_to_assets(paths, new))
+
+
+def test_touched_file_is_hashed_once(tmp_path, docs, monkeypatch):
+    df = register()
+    store = matcher.MatchStore(str(tmp_path / "store.sqlite"))
+    matcher.match_directory(str(docs), df, store)
+
+    hashed = []
+    file_hash = matcher.file_hash
+
+    def counting(source, *args, **kwargs):
+        hashed.append(source)
+        return file_hash(source, *args, **kwargs)
+
+    monkeypatch.setattr(matcher, "file_hash", counting)
+    touched = str(docs / "doc1.pdf")
+    os.utime(touched, (1, 1))
+    before = candidates(matcher.match_directory(str(docs), df, store))
+    assert hashed == [touched]
+    assert store.manifest()[touched]["mtime"] == 1
+
+    hashed.clear()
+    assert candidates(matcher.match_directory(str(docs), df, store)) == before
+    assert hashed == []
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from matcher import AssetIndex, score_candidate, top_rows
+
+MAKERS = ["Acme Pumps", "ACME pumps ltd", "Grundfos", "Daikin", "Carrier", "Trane", None, ""]
+MODELS = ["CR-10", "CR10", "XZ-2000", "AB", "ABCD-1", "VLT6000", None, ""]
+NAMES = ["Chilled water pump CHW-101", "AHU-12 supply fan", "Boiler BLR1002", "Pump P-1",
+         "Cooling Tower CT-2001", "", None]
+
+
+def register(rng: random.Random, n: int = 300) -> pd.DataFrame:
+    rows = []
+    for _ in range(n):
+        rows.append({
+            "asset_id": f"{rng.choice(['CHW', 'AHU', 'BLR', 'P', 'CT'])}-{rng.randint(100, 130)}",
+            "external_id": rng.choice(["", None, f"EXT{rng.randint(1000, 1010)}"]),
+            "tag": rng.choice([None, f"TAG-{rng.randint(100, 105)}"]),
+            "name": rng.choice(NAMES),
+            "serial": rng.choice(["SN12345", "ABC99", "", None, "X1234567"]),
+            "model": rng.choice(MODELS),
+            "manufacturer": rng.choice(MAKERS),
+            "project": rng.choice(["proj1", "ALPHA", None, ""]),
+            "file_hash": rng.choice([None, "h1", "h2"]),
+        })
+    df = pd.DataFrame(rows)
+    return df.astype(object).where(df.notna(), None)
+
+
+def query(rng: random.Random):
+    signals = {
+        "asset_ids": rng.sample(["CHW-101", "AHU-110", "TAG-101", "EXT1005", "BLR-120", "P-999"], k=rng.randint(0, 3)),
+        "serials": rng.sample(["SN12345", "ABC99", "X1234567", "NONE"], k=rng.randint(0, 2)),
+        "models": rng.sample(["CR-10", "CR10X", "XZ-2000", "VLT", "VLT6000-2", "NONE"], k=rng.randint(0, 2)),
+        "manufacturers": rng.sample(["ACME PUMPS", "GRUNDFOS LTD", "DAIKIN", "TRANE CO"], k=rng.randint(0, 2)),
+        "title_terms": rng.choice(["", "Chilled water pump", "AHU-12 supply fan unit", "Boiler", "cooling tower"]),
+    }
+    meta = {"file_path": "/x/doc.pdf", "dir": rng.choice(["/x/proj1/a", "/y/alpha", "/z"]),
+            "hash": rng.choice([None, "h1", "h3"])}
+    return meta, signals
+
+
+def expected(rows, meta, signals, k):
+    """The reference ranking: score every row, stable sort by score, keep k."""
+    scored = [(score_candidate(meta, row, signals), row["asset_id"]) for row in rows]
+    order = sorted(range(len(scored)), key=lambda i: scored[i][0][0], reverse=True)[:k]
+    return [(scored[i][0][0], ", ".join(scored[i][0][1]), scored[i][1]) for i in order]
+
+
+def got(candidates):
+    return [(c["score"], c["reasons"], c["asset_id"]) for c in candidates]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_rank_matches_stable_sort_over_score_candidate(seed):
+    rng = random.Random(seed)
+    df = register(rng)
+    rows = df.to_dict(orient="records")
+    index = AssetIndex(df)
+    queries = [query(rng) for _ in range(60)]
+    for meta, signals in queries:
+        assert got(index.top_candidates(meta, signals, k=5)) == expected(rows, meta, signals, 5)
+
+    batch = index.top_candidates_batch([m for m, _ in queries], [s for _, s in queries], k=7)
+    for (meta, signals), candidates in zip(queries, batch):
+        assert got(candidates) == expected(rows, meta, signals, 7)
+
+
+def test_top_rows_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    for n in (0, 1, 5, 50, 500):
+        for k in (0, 1, 5, 20, 600):
+            scores = rng.choice([0, 0, 0, 10, 20, 20, 35, 100], size=n)
+            order = sorted(range(n), key=lambda i: -scores[i])[:k]
+            assert top_rows(scores, k).tolist() == order